@@ -0,0 +1,156 @@
+"""
+Calibrate every camera of an image tree without the GUI.
+
+The tree is laid out like data/images/<camera>/*.jpg. Cameras are calibrated
+in parallel (one process each). Each worker commits its result with
+calibration_db.save_calibration as soon as it is done, and a JSON summary is
+printed on stdout.
+
+Usage:
+    python batch_calibrate.py [root] --square 30 --pattern 4,4 --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional, Tuple
+
+import image_io
+from board_detection import CALIBRATION_DETECTORS, benchmark_detectors
+from calibration_db import DATA_DIR, get_calibration, save_calibration, set_detector
+from camera_calibration import CameraCalibrator
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+DEFAULT_SQUARE_SIZE = 30.0
+DEFAULT_PATTERN_SIZE = (4, 4)
+DETECTOR_SAMPLE_IMAGES = 8  # Images timed per camera by --detector auto
+
+
+def find_cameras(root: str) -> List[Tuple[str, List[str]]]:
+    """
+    List the cameras of the tree with their calibration images.
+
+    Returns:
+        List of (camera_name, image_paths), cameras without images are skipped
+    """
+    cameras = []
+    for name in sorted(os.listdir(root)):
+        folder = os.path.join(root, name)
+        if not os.path.isdir(folder):
+            continue
+        images = [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+                  if f.lower().endswith(IMAGE_EXTENSIONS)]
+        if images:
+            cameras.append((name, images))
+    return cameras
+
+
+def calibrate_camera(camera_name: str, img_paths: List[str], square_size: float,
+                     pattern_size: Tuple[int, int], pyramid_max_dim: Optional[int], select: bool,
+                     save: bool, prefilter_max_dim: Optional[int] = None, detector=None) -> dict:
+    """
+    Calibrate one camera and store the result. Runs in a worker process, so detection itself stays serial.
+
+    detector is a backend name, a stored {"WxH": name} choice, or "auto" to time
+    the backends on a sample of the images and remember the fastest accurate one.
+
+    Returns:
+        Summary dictionary
+    """
+    summary = {"camera": camera_name, "images": len(img_paths), "square_size": square_size,
+               "pattern_size": list(pattern_size)}
+    start = time.perf_counter()
+    try:
+        chosen = None
+        if detector == "auto":
+            sample = [image_io.read_gray(fn, cache=False) for fn in img_paths[:DETECTOR_SAMPLE_IMAGES]]
+            sample = [gray for gray in sample if gray is not None]
+            if not sample:
+                raise ValueError("No readable image to choose a detector.")
+            chosen, report = benchmark_detectors(sample, pattern_size, for_calibration=True)
+            summary["detector_benchmark"] = report
+            detector = chosen
+        summary["detector"] = detector
+        calibrator = CameraCalibrator(square_size, pattern_size, pyramid_max_dim=pyramid_max_dim,
+                                      prefilter_max_dim=prefilter_max_dim, detector=detector)
+        rms, camera_matrix, dist_coefs, failures = calibrator.calibrate_from_files(img_paths, workers=1)
+        summary["detect_and_solve_s"] = time.perf_counter() - start
+        if calibrator.prefilter is not None:
+            summary["prefilter"] = calibrator.prefilter.report()
+        if select and len(calibrator.views) > 1:
+            _paths, report = calibrator.select_views()
+            rms, camera_matrix, dist_coefs = calibrator.rms, calibrator.camera_matrix, calibrator.dist_coefs
+            summary["selection"] = report
+        if save:
+            save_calibration(camera_name, camera_matrix, dist_coefs, square_size, pattern_size,
+                             calibrator.image_size)
+            if chosen is not None:
+                set_detector(camera_name, calibrator.image_size, chosen)
+    except Exception as e:
+        summary.update(status="error", error=str(e), seconds=time.perf_counter() - start)
+        return summary
+
+    summary.update(
+        status="ok",
+        views=len(calibrator.views),
+        failures=[{"image": fn, "reason": reason} for fn, reason in failures],
+        rms=rms,
+        image_size=list(calibrator.image_size),
+        seconds=time.perf_counter() - start
+    )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate every camera found under a data/images style tree.")
+    parser.add_argument("root", nargs="?", default=os.path.join(DATA_DIR, "images"),
+                        help="Folder containing one sub-folder of images per camera")
+    parser.add_argument("--square", type=float, default=None,
+                        help=f"Square size in mm (default: stored value or {DEFAULT_SQUARE_SIZE})")
+    parser.add_argument("--pattern", default=None,
+                        help="Inner corners per row and column, e.g. 4,4 (default: stored value or 4,4)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of cameras calibrated at once")
+    parser.add_argument("--pyramid", type=int, default=1280, help="pyramid_max_dim of the calibrator (0 disables)")
+    parser.add_argument("--prefilter", type=int, default=0,
+                        help="Reject images failing a fast board check on a copy of this size (0 disables)")
+    parser.add_argument("--detector", choices=["auto"] + list(CALIBRATION_DETECTORS), default=None,
+                        help="Board detector backend, 'auto' benchmarks them and remembers the choice "
+                             "(default: stored choice or classic)")
+    parser.add_argument("--select", action="store_true", help="Reduce each camera to a minimal set of views")
+    parser.add_argument("--dry-run", action="store_true", help="Do not write the calibration database")
+    args = parser.parse_args()
+
+    cameras = find_cameras(args.root)
+    jobs = []
+    for name, images in cameras:
+        previous = get_calibration(name) or {}
+        square_size = args.square or previous.get("square_size", DEFAULT_SQUARE_SIZE)
+        pattern_size = (tuple(map(int, args.pattern.split(","))) if args.pattern
+                        else tuple(previous.get("pattern_size", DEFAULT_PATTERN_SIZE)))
+        detector = args.detector or previous.get("detectors")
+        jobs.append((name, images, square_size, pattern_size, args.pyramid or None, args.select, not args.dry_run,
+                     args.prefilter or None, detector))
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(calibrate_camera, *job) for job in jobs]
+        for future in as_completed(futures):
+            summary = future.result()
+            results.append(summary)
+            print(f"{summary['camera']}: {summary['status']}", file=sys.stderr)
+
+    results.sort(key=lambda r: r["camera"])
+    print(json.dumps({
+        "root": args.root,
+        "cameras": results,
+        "calibrated": sum(r["status"] == "ok" for r in results),
+        "failed": sum(r["status"] != "ok" for r in results),
+        "wall_s": time.perf_counter() - start
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Synthetic benchmark of the calibration pipeline.
+
+Chessboard views are rendered with known intrinsics and distortion at several
+resolutions and view counts, then detection (the board search of
+CameraCalibrator with refine=False), corner refinement (the extra time the
+same search takes with its cornerSubPix) and cv2.calibrateCamera are timed
+separately.
+Throughput, peak resident memory (OpenCV allocations included) and the error
+of the recovered parameters against the ground truth are reported.
+
+Usage:
+    python benchmark_calibration.py --resolutions 1280x720,4000x3000 --views 10,40
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import image_io
+from camera_calibration import CameraCalibrator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Ground truth distortion (k1, k2, p1, p2, k3), typical of a phone main camera
+TRUE_DIST_COEFS = np.array([0.12, -0.25, 0.001, -0.0005, 0.1])
+SQUARE_PIXELS = 64  # Resolution of the rendered board texture
+
+
+def true_camera_matrix(image_size: Tuple[int, int]) -> np.ndarray:
+    w, h = image_size
+    f = 0.8 * max(w, h)
+    return np.array([[f, 0, (w - 1) / 2 + 0.01 * w],
+                     [0, f, (h - 1) / 2 - 0.01 * h],
+                     [0, 0, 1]], dtype=np.float64)
+
+
+def board_texture(pattern_size: Tuple[int, int]) -> np.ndarray:
+    cols, rows = pattern_size[0] + 1, pattern_size[1] + 1
+    texture = np.full(((rows + 2) * SQUARE_PIXELS, (cols + 2) * SQUARE_PIXELS), 255, np.uint8)
+    for r in range(rows):
+        for c in range(cols):
+            if (r + c) % 2 == 0:
+                texture[(r + 1) * SQUARE_PIXELS:(r + 2) * SQUARE_PIXELS,
+                        (c + 1) * SQUARE_PIXELS:(c + 2) * SQUARE_PIXELS] = 0
+    return texture
+
+
+def distortion_maps(camera_matrix: np.ndarray, image_size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For every pixel of the distorted image, the location it comes from in the ideal pinhole image.
+    """
+    w, h = image_size
+    map_x = np.empty((h, w), np.float32)
+    map_y = np.empty((h, w), np.float32)
+    xs = np.arange(w, dtype=np.float32)
+    rows_per_chunk = max(1, (1 << 20) // w)
+    for y0 in range(0, h, rows_per_chunk):
+        y1 = min(h, y0 + rows_per_chunk)
+        grid = np.stack(np.broadcast_arrays(xs[None, :], np.arange(y0, y1, dtype=np.float32)[:, None]), axis=-1)
+        ideal = cv2.undistortPoints(grid.reshape(-1, 1, 2), camera_matrix, TRUE_DIST_COEFS, P=camera_matrix)
+        ideal = ideal.reshape(y1 - y0, w, 2)
+        map_x[y0:y1], map_y[y0:y1] = ideal[..., 0], ideal[..., 1]
+    return map_x, map_y
+
+
+def render_views(calibrator: CameraCalibrator, image_size: Tuple[int, int], count: int,
+                 out_dir: str, seed: int = 0) -> List[str]:
+    """
+    Render count views of the board seen by the ground truth camera and save them as JPEG.
+    """
+    rng = np.random.default_rng(seed)
+    w, h = image_size
+    camera_matrix = true_camera_matrix(image_size)
+    map_x, map_y = distortion_maps(camera_matrix, image_size)
+    texture = board_texture(calibrator.pattern_size)
+
+    # Texture pixel -> board coordinates (mm); inner corner (0, 0) sits on the edge of pixel 2 * SQUARE_PIXELS
+    mm_per_pixel = calibrator.square_size / SQUARE_PIXELS
+    origin = 2 * SQUARE_PIXELS - 0.5
+    texture_to_board = np.array([[mm_per_pixel, 0, -origin * mm_per_pixel],
+                                 [0, mm_per_pixel, -origin * mm_per_pixel],
+                                 [0, 0, 1]])
+    board_w = (calibrator.pattern_size[0] + 1) * calibrator.square_size
+    board_h = (calibrator.pattern_size[1] + 1) * calibrator.square_size
+    outline = np.array([[-calibrator.square_size, -calibrator.square_size, 0],
+                        [board_w, -calibrator.square_size, 0],
+                        [board_w, board_h, 0],
+                        [-calibrator.square_size, board_h, 0]], dtype=np.float64)
+
+    paths = []
+    while len(paths) < count:
+        rvec = rng.uniform(-0.6, 0.6, 3)
+        distance = rng.uniform(1.2, 3.0) * camera_matrix[0, 0] * board_w / w
+        tvec = np.array([rng.uniform(-0.6, 0.2) * board_w, rng.uniform(-0.6, 0.2) * board_h, distance])
+        projected, _ = cv2.projectPoints(outline, rvec, tvec, camera_matrix, TRUE_DIST_COEFS)
+        projected = projected.reshape(-1, 2)
+        if (projected.min(axis=0) < 0).any() or (projected.max(axis=0) >= (w, h)).any():
+            continue
+
+        rotation, _ = cv2.Rodrigues(rvec)
+        board_to_ideal = camera_matrix @ np.column_stack((rotation[:, 0], rotation[:, 1], tvec))
+        ideal = cv2.warpPerspective(texture, board_to_ideal @ texture_to_board, (w, h),
+                                    flags=cv2.INTER_LINEAR, borderValue=190)
+        img = cv2.remap(ideal, map_x, map_y, cv2.INTER_LINEAR, borderValue=190)
+        img = np.clip(img + rng.normal(0, 2, img.shape), 0, 255).astype(np.uint8)
+
+        path = os.path.join(out_dir, f"view_{len(paths):03d}.jpg")
+        cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        paths.append(path)
+    return paths
+
+
+def reset_peak_memory() -> bool:
+    """
+    Reset the peak resident memory of the process (Linux only).
+
+    Returns:
+        False when the peak cannot be reset: peak_memory_mb then gives the peak since the process started
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_memory_mb() -> Optional[float]:
+    """Peak resident memory of the process in MB (None when it cannot be measured)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(image_size: Tuple[int, int], view_count: int, pattern_size: Tuple[int, int],
+             square_size: float, pyramid_max_dim) -> dict:
+    calibrator = CameraCalibrator(square_size, pattern_size, pyramid_max_dim=pyramid_max_dim)
+    with tempfile.TemporaryDirectory() as out_dir:
+        paths = render_views(calibrator, image_size, view_count, out_dir)
+
+        reset_peak_memory()
+        # Detection: the calibrator's own search without cornerSubPix
+        search_time = 0.0
+        start = time.perf_counter()
+        for fn in paths:
+            gray = image_io.read_gray(fn, cache=False)
+            search_start = time.perf_counter()
+            calibrator._find_corners(gray, refine=False)
+            search_time += time.perf_counter() - search_start
+        detect_time = time.perf_counter() - start
+
+        # Refinement: the same search with cornerSubPix, minus the search alone
+        img_points = []
+        refined_search_time = 0.0
+        for fn in paths:
+            gray = image_io.read_gray(fn, cache=False)
+            search_start = time.perf_counter()
+            corners = calibrator._find_corners(gray)
+            refined_search_time += time.perf_counter() - search_start
+            if corners is not None:
+                img_points.append(corners.reshape(-1, 2))
+        refine_time = max(0.0, refined_search_time - search_time)
+
+    if not img_points:
+        raise RuntimeError(f"No board detected at {image_size[0]}x{image_size[1]}.")
+
+    start = time.perf_counter()
+    rms, camera_matrix, dist_coefs, _rvecs, _tvecs = cv2.calibrateCamera(
+        [calibrator._pattern_points] * len(img_points), img_points, image_size, None, None
+    )
+    calib_time = time.perf_counter() - start
+    # Resident memory of the whole process, measured from the start of detection
+    peak_mem = peak_memory_mb()
+
+    truth = true_camera_matrix(image_size)
+    return {
+        "resolution": f"{image_size[0]}x{image_size[1]}",
+        "views": view_count,
+        "detected": len(img_points),
+        "detect_s": detect_time,
+        "images_per_s": view_count / detect_time,
+        "refine_s": refine_time,
+        "calibrate_s": calib_time,
+        "peak_mem_mb": peak_mem,
+        "rms_px": rms,
+        "focal_err_pct": 100 * float(np.abs(np.diag(camera_matrix)[:2] - np.diag(truth)[:2]).max() / truth[0, 0]),
+        "center_err_px": float(np.abs(camera_matrix[:2, 2] - truth[:2, 2]).max()),
+        "dist_err": float(np.abs(dist_coefs.ravel()[:5] - TRUE_DIST_COEFS).max()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the calibration pipeline on synthetic chessboards.")
+    parser.add_argument("--resolutions", default="1280x720,1920x1080,4000x3000",
+                        help="Comma separated list of WIDTHxHEIGHT")
+    parser.add_argument("--views", default="10,30", help="Comma separated list of view counts")
+    parser.add_argument("--pattern", default="9,6", help="Inner corners per row and column")
+    parser.add_argument("--square", type=float, default=25.0, help="Square size (mm)")
+    parser.add_argument("--pyramid", type=int, default=None, help="pyramid_max_dim of the calibrator")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    resolutions = [tuple(map(int, r.split("x"))) for r in args.resolutions.split(",")]
+    view_counts = [int(v) for v in args.views.split(",")]
+    pattern_size = tuple(map(int, args.pattern.split(",")))
+
+    results = [run_case(size, count, pattern_size, args.square, args.pyramid)
+               for size in resolutions for count in view_counts]
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+    columns = list(results[0].keys())
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(f"{v:.4g}" if isinstance(v, float) else str(v) for v in result.values()))
+
+
+if __name__ == "__main__":
+    main()
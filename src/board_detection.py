@@ -0,0 +1,419 @@
+"""
+Chessboard search shared by CameraCalibrator and CoordinateTransformer.
+
+When the board is expected near a known place (previous detection, same
+set-up), it is first searched in a padded crop around that region and the
+full frame is only searched if that fails.
+
+BoardPrefilter rejects images without a board before the full search: most
+of them fail a fast check on a small copy in a few milliseconds, while
+findChessboardCorners spends its worst-case time on exactly those images.
+
+The board itself is found by a detector backend, chosen by name (DETECTORS):
+- "classic": cv2.findChessboardCorners, pixel accurate (callers refine with cornerSubPix)
+- "sb": cv2.findChessboardCornersSB, sector based, subpixel accurate
+- "charuco": ChArUco board (cv2.aruco), every inner corner visible
+- "charuco-partial": ChArUco board, occluded corners filled in through the
+  homography of the visible ones (for homographies, not for calibration)
+Only the backends of CALIBRATION_DETECTORS report measured corners, the others
+must not be used by CameraCalibrator. benchmark_detectors picks the fastest
+backend meeting an accuracy threshold.
+"""
+import functools
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+# Margin added on every side of a prior region, as a fraction of its size
+ROI_PADDING = 0.5
+# Rejects most images without a board in a few milliseconds
+FAST_CHECK_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
+
+Region = Tuple[int, int, int, int]  # (x, y, width, height), as cv2.boundingRect
+
+# Audit sampling must not depend on per-process state: worker processes run on copies of the prefilter
+_audit_random = random.SystemRandom()
+
+
+def board_region(corners: np.ndarray, pattern_size: Tuple[int, int]) -> Region:
+    """
+    Bounding box of the whole board (outer squares included) from its inner corners.
+
+    Args:
+        corners: Inner corners, N x 2 or N x 1 x 2 pixel coordinates
+        pattern_size: Inner corners per row and column
+
+    Returns:
+        (x, y, width, height)
+    """
+    corners = corners.reshape(-1, 2)
+    x0, y0 = corners.min(axis=0)
+    x1, y1 = corners.max(axis=0)
+    # The inner corners stop one square before the edge of the board
+    square_x = (x1 - x0) / max(1, pattern_size[0] - 1)
+    square_y = (y1 - y0) / max(1, pattern_size[1] - 1)
+    square = max(square_x, square_y)
+    x0, y0 = int(np.floor(x0 - square)), int(np.floor(y0 - square))
+    x1, y1 = int(np.ceil(x1 + square)), int(np.ceil(y1 + square))
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def search_window(region: Region, image_shape: Tuple[int, int], padding: float = ROI_PADDING
+                  ) -> Tuple[int, int, int, int]:
+    """
+    Padded region clipped to the image.
+
+    Returns:
+        (x0, y0, x1, y1) pixel bounds of the crop
+    """
+    x, y, w, h = region
+    height, width = image_shape[:2]
+    pad_x, pad_y = int(w * padding), int(h * padding)
+    return max(0, x - pad_x), max(0, y - pad_y), min(width, x + w + pad_x), min(height, y + h + pad_y)
+
+
+class ChessboardDetector:
+    """Classic cv2.findChessboardCorners, pixel accurate."""
+    name = "classic"
+    subpixel = False
+    # Every corner returned was measured in the image, so the corners can feed calibrateCamera
+    calibration_safe = True
+    # Finds partly hidden boards: BoardPrefilter, which checks for the whole board, must not run in front of it
+    partial_boards = False
+
+    def __init__(self, pattern_size: Tuple[int, int]):
+        self.pattern_size = tuple(pattern_size)
+
+    def find(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Returns:
+            N x 1 x 2 float32 corners in pattern order, or None if the board is not found
+        """
+        found, corners = cv2.findChessboardCorners(gray, self.pattern_size)
+        return corners if found else None
+
+
+class SectorDetector(ChessboardDetector):
+    """cv2.findChessboardCornersSB: sector based, robust to blur and noise, subpixel accurate."""
+    name = "sb"
+    subpixel = True
+
+    def find(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        found, corners = cv2.findChessboardCornersSB(gray, self.pattern_size, flags=cv2.CALIB_CB_NORMALIZE_IMAGE)
+        return corners.reshape(-1, 1, 2).astype(np.float32) if found else None
+
+
+class CharucoDetector(ChessboardDetector):
+    """
+    ChArUco board whose inner chessboard corners match pattern_size.
+
+    The markers identify every corner, so the order never flips. With
+    min_corners, boards partially hidden or cut by the image border are
+    accepted: the missing corners are placed with the homography fitted to
+    the visible ones, which is exact for undistorted images only.
+    """
+    name = "charuco"
+    subpixel = True
+
+    def __init__(self, pattern_size: Tuple[int, int], dictionary: int = cv2.aruco.DICT_4X4_50,
+                 marker_ratio: float = 0.75, min_corners: Optional[int] = None):
+        super().__init__(pattern_size)
+        cols, rows = self.pattern_size
+        board = cv2.aruco.CharucoBoard((cols + 1, rows + 1), 1.0, marker_ratio,
+                                       cv2.aruco.getPredefinedDictionary(dictionary))
+        self._detector = cv2.aruco.CharucoDetector(board)
+        self.min_corners = min_corners
+        if min_corners is not None:
+            self.name = "charuco-partial"
+            self.calibration_safe = False
+            self.partial_boards = True
+
+    def find(self, gray: np.ndarray) -> Optional[np.ndarray]:
+        corners, ids, _marker_corners, _marker_ids = self._detector.detectBoard(gray)
+        if ids is None:
+            return None
+        count = self.pattern_size[0] * self.pattern_size[1]
+        ids = ids.ravel()
+        if len(ids) == count:
+            full = np.empty((count, 1, 2), np.float32)
+            full[ids] = corners.reshape(-1, 1, 2)
+            return full
+        if self.min_corners is None or len(ids) < max(4, self.min_corners):
+            return None
+        grid = np.indices(self.pattern_size).T.reshape(-1, 2).astype(np.float32)
+        H, _ = cv2.findHomography(grid[ids], corners.reshape(-1, 2))
+        if H is None:
+            return None
+        full = cv2.perspectiveTransform(grid[:, None, :], H).astype(np.float32)
+        full[ids] = corners.reshape(-1, 1, 2)
+        return full
+
+
+class PartialCharucoDetector(CharucoDetector):
+    """ChArUco board, at least min_corners visible: the others are filled in (not for calibration)."""
+    name = "charuco-partial"
+    calibration_safe = False
+    partial_boards = True
+
+    def __init__(self, pattern_size: Tuple[int, int], min_corners: int = 6, **kwargs):
+        super().__init__(pattern_size, min_corners=min_corners, **kwargs)
+
+
+DETECTORS = {
+    "classic": ChessboardDetector,
+    "sb": SectorDetector,
+    "charuco": CharucoDetector,
+    "charuco-partial": PartialCharucoDetector,
+}
+DEFAULT_DETECTOR = "classic"
+# Backends whose corners can be used to calibrate a camera
+CALIBRATION_DETECTORS = tuple(name for name, backend in DETECTORS.items() if backend.calibration_safe)
+
+# A detector name, or a choice per resolution as stored by calibration_db: {"WIDTHxHEIGHT": name}
+DetectorChoice = Union[None, str, Dict[str, str]]
+
+
+@functools.lru_cache(maxsize=None)
+def get_detector(name: str, pattern_size: Tuple[int, int]) -> ChessboardDetector:
+    """
+    Detector backend by name, created once per process (OpenCV detectors cannot be pickled).
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector '{name}', expected one of {', '.join(DETECTORS)}.")
+    return DETECTORS[name](tuple(pattern_size))
+
+
+def detector_name(choice: DetectorChoice, image_shape: Tuple[int, int]) -> str:
+    """
+    Resolve a detector choice for an image of image_shape (height, width).
+    """
+    if choice is None:
+        return DEFAULT_DETECTOR
+    if isinstance(choice, str):
+        return choice
+    h, w = image_shape[:2]
+    return choice.get(f"{w}x{h}", DEFAULT_DETECTOR)
+
+
+def match_corner_order(corners: np.ndarray, reference: np.ndarray, pattern_size: Tuple[int, int]) -> np.ndarray:
+    """
+    Reorder corners to the ordering of reference.
+
+    A symmetric board can be reported from another corner: reversed for any
+    pattern, rotated by a quarter turn as well for a square one. The symmetric
+    ordering closest to reference (mean corner distance) is returned.
+
+    Args:
+        corners: Corners to reorder, N x 2 or N x 1 x 2
+        reference: Corners of the same board, N x 2 or N x 1 x 2
+        pattern_size: Inner corners per row and column
+
+    Returns:
+        N x 2 corners
+    """
+    cols, rows = pattern_size
+    grid = corners.reshape(rows, cols, 2)
+    reference = reference.reshape(-1, 2)
+    candidates = [grid, grid[::-1, ::-1]]
+    if cols == rows:
+        candidates += [np.rot90(grid, 1), np.rot90(grid, 3)]
+    candidates = [candidate.reshape(-1, 2) for candidate in candidates]
+    return min(candidates, key=lambda candidate: np.linalg.norm(candidate - reference, axis=1).mean())
+
+
+def find_chessboard(gray: np.ndarray, pattern_size: Tuple[int, int], prior: Optional[Region] = None,
+                    finder: Optional[Callable[[np.ndarray], Optional[np.ndarray]]] = None,
+                    padding: float = ROI_PADDING) -> Optional[np.ndarray]:
+    """
+    Find the board, searching the padded prior region before the full frame.
+
+    Args:
+        gray: Grayscale image
+        pattern_size: Inner corners per row and column
+        prior: Optional (x, y, width, height) region where the board is expected
+        finder: Function returning the corners found in a grayscale image, or None
+            (default: the classic detector)
+        padding: Margin added around the prior, as a fraction of its size
+
+    Returns:
+        Corners in full image pixel coordinates, or None if not found
+    """
+    if finder is None:
+        finder = get_detector(DEFAULT_DETECTOR, tuple(pattern_size)).find
+    if prior is not None:
+        x0, y0, x1, y1 = search_window(prior, gray.shape, padding)
+        height, width = gray.shape[:2]
+        if x1 > x0 and y1 > y0 and (x1 - x0) * (y1 - y0) < width * height:
+            corners = finder(gray[y0:y1, x0:x1])
+            if corners is not None:
+                return (corners + np.array([x0, y0], dtype=np.float32)).astype(np.float32)
+    return finder(gray)
+
+
+class BoardPrefilter:
+    """
+    Board presence test on a downscaled copy (CALIB_CB_FAST_CHECK), with statistics.
+
+    The check looks for the whole classic board: callers skip it for
+    backends finding partly hidden boards (partial_boards).
+
+    run puts the test in front of a full search. A random sample of one
+    rejected image in audit_every is searched anyway: that measures what a
+    search on an image without a board costs (for the time saved estimate)
+    and catches boards the fast check missed.
+    """
+
+    def __init__(self, pattern_size: Tuple[int, int], max_dim: int = 640, audit_every: int = 25):
+        """
+        Args:
+            pattern_size: Inner corners per row and column
+            max_dim: Size of the longest side of the copy checked
+            audit_every: On average one rejected image in audit_every gets the full search anyway (0 disables)
+        """
+        self.pattern_size = pattern_size
+        self.max_dim = max_dim
+        self.audit_every = audit_every
+        self.stats = dict.fromkeys(("checked", "rejected", "check_s", "audits", "audit_s", "missed"), 0)
+
+    def check(self, gray: np.ndarray) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        Look for the board on a copy of gray downscaled to max_dim.
+
+        Returns:
+            (corners, scale): the coarse corners on the copy and its scale factor,
+            or None when the image has no board
+        """
+        start = time.perf_counter()
+        h, w = gray.shape[:2]
+        scale = min(1.0, self.max_dim / max(h, w))
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+        found, corners = cv2.findChessboardCorners(small, self.pattern_size, flags=FAST_CHECK_FLAGS)
+        self.stats["checked"] += 1
+        self.stats["rejected"] += not found
+        self.stats["check_s"] += time.perf_counter() - start
+        return (corners, scale) if found else None
+
+    def run(self, gray: np.ndarray, search: Callable[[np.ndarray], Optional[np.ndarray]]) -> Optional[np.ndarray]:
+        """
+        Run search on gray unless the fast check rejects it.
+
+        Args:
+            gray: Grayscale image
+            search: Full search, returning the corners or None
+
+        Returns:
+            The result of search, None for rejected images
+        """
+        if self.check(gray) is not None:
+            return search(gray)
+        if not self.audit_every or _audit_random.random() * self.audit_every >= 1:
+            return None
+        start = time.perf_counter()
+        corners = search(gray)
+        self.stats["audits"] += 1
+        self.stats["audit_s"] += time.perf_counter() - start
+        self.stats["missed"] += corners is not None
+        return corners
+
+    def merge(self, stats: dict):
+        """Add statistics gathered elsewhere (e.g. by the copy of a worker process)."""
+        for key, value in stats.items():
+            self.stats[key] += value
+
+    def report(self) -> dict:
+        """
+        Returns:
+            Dictionary with the number of images checked and rejected, the reject rate,
+            the boards found by audits among rejected images (missed), the time spent
+            checking and the net time saved, estimated from the audited searches
+            (None before the first audit)
+        """
+        stats = self.stats
+        time_saved = None
+        if stats["audits"]:
+            mean_search = stats["audit_s"] / stats["audits"]
+            time_saved = (stats["rejected"] - stats["audits"]) * mean_search - stats["check_s"]
+        return {
+            "checked": stats["checked"],
+            "rejected": stats["rejected"],
+            "reject_rate": stats["rejected"] / stats["checked"] if stats["checked"] else 0.0,
+            "missed": stats["missed"],
+            "check_s": stats["check_s"],
+            "time_saved_s": time_saved
+        }
+
+
+def benchmark_detectors(images: List[np.ndarray], pattern_size: Tuple[int, int],
+                        names: Optional[List[str]] = None, max_error: float = 0.15,
+                        for_calibration: bool = False) -> Tuple[str, Dict[str, dict]]:
+    """
+    Time the detector backends on sample images and pick the fastest accurate one.
+
+    Each backend is timed up to subpixel corners (cornerSubPix is added for
+    pixel accurate backends). Its error is the largest mean corner distance
+    to a reference (classic detection with a tight cornerSubPix, or the SB
+    detection when the classic one fails). A backend qualifies when it finds
+    the board in as many images as the best backend and its error is below
+    max_error.
+
+    Args:
+        images: Grayscale sample images of one camera at one resolution
+        pattern_size: Inner corners per row and column
+        names: Backends to compare (default: all of DETECTORS, or CALIBRATION_DETECTORS)
+        max_error: Largest accepted error in pixels
+        for_calibration: The choice is for CameraCalibrator: only CALIBRATION_DETECTORS are compared
+
+    Returns:
+        Tuple of (chosen name, {name: {"found", "mean_ms", "error_px", "qualified"}}).
+        DEFAULT_DETECTOR is chosen when no backend qualifies.
+    """
+    pattern_size = tuple(pattern_size)
+    names = list(names or (CALIBRATION_DETECTORS if for_calibration else DETECTORS))
+    if for_calibration:
+        unsafe = [name for name in names if name not in CALIBRATION_DETECTORS]
+        if unsafe:
+            raise ValueError(f"Detectors {', '.join(unsafe)} cannot be used for calibration.")
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    tight = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 1e-4)
+
+    references = []
+    for gray in images:
+        reference = get_detector("classic", pattern_size).find(gray)
+        if reference is not None:
+            reference = cv2.cornerSubPix(gray, reference, (11, 11), (-1, -1), tight)
+        else:
+            reference = get_detector("sb", pattern_size).find(gray)
+        references.append(reference)
+
+    report = {}
+    for name in names:
+        detector = get_detector(name, pattern_size)
+        found, elapsed, errors = 0, 0.0, []
+        for gray, reference in zip(images, references):
+            start = time.perf_counter()
+            corners = detector.find(gray)
+            if corners is not None and not detector.subpixel:
+                corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+            elapsed += time.perf_counter() - start
+            if corners is None:
+                continue
+            found += 1
+            if reference is not None:
+                corners = match_corner_order(corners, reference, pattern_size)
+                errors.append(np.linalg.norm(corners - reference.reshape(-1, 2), axis=1).mean())
+        report[name] = {
+            "found": found,
+            "mean_ms": 1000 * elapsed / max(1, len(images)),
+            "error_px": float(max(errors)) if errors else None,
+        }
+
+    best_found = max(entry["found"] for entry in report.values())
+    for entry in report.values():
+        entry["qualified"] = bool(best_found and entry["found"] == best_found
+                                  and entry["error_px"] is not None and entry["error_px"] <= max_error)
+    qualified = [name for name in names if report[name]["qualified"]]
+    chosen = min(qualified, key=lambda name: report[name]["mean_ms"]) if qualified else DEFAULT_DETECTOR
+    return chosen, report
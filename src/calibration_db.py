@@ -1,29 +1,343 @@
+import contextlib
 import json
 import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
 import numpy as np
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
+# JSON file, kept as the import/export format
 CALIB_DB = os.path.join(DATA_DIR, "calibration_db.json")
+# Indexed store: one record per camera
+CALIB_STORE = os.path.join(DATA_DIR, "calibration_db.sqlite")
 
-def load_calibrations():
-    if os.path.exists(CALIB_DB):
-        with open(CALIB_DB, "r") as f:
-            return json.load(f)
-    else:
-        return {}
+# Relative difference of width/height ratios still considered the same aspect ratio
+ASPECT_TOLERANCE = 0.01
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calibrations (
+    camera_name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+def scale_camera_matrix(camera_matrix, from_size, to_size):
+    """
+    Express a camera matrix calibrated at from_size for images of to_size (width, height).
+
+    The distortion coefficients act on normalized coordinates and do not change.
+    Raises ValueError when the aspect ratios differ (cropped stream, rotated image).
+    """
+    (w0, h0), (w1, h1) = from_size, to_size
+    if abs((w1 / h1) / (w0 / h0) - 1) > ASPECT_TOLERANCE:
+        raise ValueError(f"Image size {w1}x{h1} does not have the aspect ratio of the calibration ({w0}x{h0}).")
+    sx, sy = w1 / w0, h1 / h0
+    scaled = np.array(camera_matrix, dtype=np.float64)
+    scaled[0, 0] *= sx
+    scaled[0, 1] *= sx
+    scaled[1, 1] *= sy
+    # Pixel centers: pixel i covers [i - 0.5, i + 0.5]
+    scaled[0, 2] = (scaled[0, 2] + 0.5) * sx - 0.5
+    scaled[1, 2] = (scaled[1, 2] + 0.5) * sy - 0.5
+    return scaled
+
+
+class CameraModel:
+    """
+    Calibration of one camera, ready to use: float64 arrays and pattern metadata.
+
+    Instances are shared by get_camera_model, so their arrays are read-only.
+    image_size is the (width, height) the camera was calibrated at, None for
+    calibrations saved before it was recorded. Intrinsics for other resolutions
+    come from CoordinateTransformer.camera_matrix_for. detectors maps "WIDTHxHEIGHT"
+    to the board detector backend chosen for that resolution (see set_detector).
+    """
+
+    def __init__(self, name, camera_matrix, dist_coefs, square_size, pattern_size, image_size=None,
+                 detectors=None):
+        self.name = name
+        self.camera_matrix = np.array(camera_matrix, dtype=np.float64)
+        self.dist_coefs = np.array(dist_coefs, dtype=np.float64)
+        self.camera_matrix.setflags(write=False)
+        self.dist_coefs.setflags(write=False)
+        self.square_size = float(square_size)
+        self.pattern_size = tuple(int(n) for n in pattern_size)
+        self.image_size = tuple(int(n) for n in image_size) if image_size else None
+        self.detectors = dict(detectors or {})
+
+    @classmethod
+    def from_record(cls, name, record):
+        return cls(name, record["camera_matrix"], record["dist_coefs"], record["square_size"], record["pattern_size"],
+                   record.get("image_size"), record.get("detectors"))
+
+
+# In-process cache of CameraModel objects. It is dropped whenever this process
+# writes the store (_version) or the store file changes on disk (another process).
+_models = {}
+_models_stamp = None
+_models_lock = threading.Lock()
+_version = 0
+
+
+def _store_stamp():
+    stamps = [_version]
+    for path in (CALIB_STORE, CALIB_STORE + "-wal"):
+        try:
+            stat = os.stat(path)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+def _invalidate_models():
+    global _version
+    with _models_lock:
+        _version += 1
+        _models.clear()
 
-def save_calibration(camera_name, camera_matrix, dist_coefs, square_size, pattern_size):
+
+def get_camera_model(camera_name):
+    """
+    Return the CameraModel of a camera, or None if it is not calibrated.
+
+    Repeated lookups return the same object until the store changes.
+    """
+    global _models_stamp
+    stamp = _store_stamp()
+    with _models_lock:
+        if stamp != _models_stamp:
+            _models.clear()
+            _models_stamp = stamp
+        model = _models.get(camera_name)
+    if model is not None:
+        return model
+
+    record = get_calibration(camera_name)
+    if record is None:
+        return None
+    model = CameraModel.from_record(camera_name, record)
+    with _models_lock:
+        if _models_stamp == stamp:
+            _models[camera_name] = model
+    return model
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive inter-process lock on path + ".lock" for the duration of the block.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "a+b") as lock_file:
+        if os.name == "nt":
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write_json(path, data, indent=None):
+    """
+    Write data as JSON to a temporary file next to path, then rename it over path.
+    Readers see either the old or the new content, never a truncated file.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# One connection per thread (sqlite3 connections cannot be shared between threads),
+# reopened when the store path changes or in a forked child
+_local = threading.local()
+# Stores whose schema and JSON migration were already set up by this process
+_initialized_stores = set()
+_init_lock = threading.Lock()
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key == (CALIB_STORE, os.getpid()):
+        return conn
     # Create the data directory if it doesn't exist
     os.makedirs(DATA_DIR, exist_ok=True)
-    
-    calibrations = load_calibrations()
-    calibrations[camera_name] = {
-        "camera_matrix": camera_matrix.tolist(),
-        "dist_coefs": dist_coefs.tolist(),
-        "square_size": square_size,
-        "pattern_size": list(pattern_size)
-    }
-    with open(CALIB_DB, "w") as f:
-        json.dump(calibrations, f, indent=4)
\ No newline at end of file
+    # Transactions are managed explicitly (see _write_transaction); waiting writers retry for up to 30 s
+    conn = sqlite3.connect(CALIB_STORE, timeout=30, isolation_level=None)
+    with _init_lock:
+        if CALIB_STORE not in _initialized_stores:
+            _initialize_store(conn)
+            _initialized_stores.add(CALIB_STORE)
+    _local.conn, _local.key = conn, (CALIB_STORE, os.getpid())
+    return conn
+
+
+def _initialize_store(conn):
+    # Write-ahead log: readers never block the writer and a crash never leaves a half-written store.
+    # The mode is stored in the database file, so it only needs setting once.
+    conn.execute("PRAGMA journal_mode=WAL")
+    with _write_transaction(conn):
+        is_new = conn.execute("SELECT name FROM sqlite_master WHERE name = 'calibrations'").fetchone() is None
+        conn.execute(_SCHEMA)
+        if is_new and os.path.exists(CALIB_DB):
+            # First use: take over the calibrations of the JSON file in the transaction creating the table,
+            # so no other process can see the store before they are there
+            _insert_records(conn, _read_json(CALIB_DB), replace=False)
+    _invalidate_models()
+
+
+@contextlib.contextmanager
+def _write_transaction(conn):
+    # IMMEDIATE takes the write lock up front, so the read-merge-write of a record cannot interleave
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _insert_records(conn, calibrations, replace=True):
+    now = time.time()
+    verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+    conn.executemany(
+        f"{verb} INTO calibrations (camera_name, data, updated) VALUES (?, ?, ?)",
+        [(name, json.dumps(record), now) for name, record in calibrations.items()]
+    )
+
+
+def _import_records(conn, calibrations, replace=True):
+    with _write_transaction(conn):
+        _insert_records(conn, calibrations, replace)
+    _invalidate_models()
+
+
+def load_calibrations():
+    """Return every calibration as {camera_name: record}."""
+    rows = _connect().execute("SELECT camera_name, data FROM calibrations ORDER BY camera_name").fetchall()
+    return {name: json.loads(data) for name, data in rows}
+
+
+def list_cameras():
+    """Return the names of the calibrated cameras without decoding their records."""
+    rows = _connect().execute("SELECT camera_name FROM calibrations ORDER BY camera_name").fetchall()
+    return [name for (name,) in rows]
+
+
+def get_calibration(camera_name):
+    """Return the calibration record of one camera, or None if it is not calibrated."""
+    row = _connect().execute("SELECT data FROM calibrations WHERE camera_name = ?", (camera_name,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def save_calibration(camera_name, camera_matrix, dist_coefs, square_size, pattern_size, image_size=None):
+    fields = dict(
+        camera_matrix=camera_matrix.tolist(),
+        dist_coefs=dist_coefs.tolist(),
+        square_size=square_size,
+        pattern_size=list(pattern_size),
+        # Always written, so a new solve never keeps the resolution of the previous one
+        image_size=[int(n) for n in image_size] if image_size is not None else None
+    )
+    update_calibration(camera_name, **fields)
+
+
+def update_calibration(camera_name, **fields):
+    """
+    Merge fields into the record of one camera in a single short transaction.
+
+    Fields written concurrently by other processes for the same camera are kept,
+    so workers can commit their own results at any time without a global lock.
+    """
+    _update_record(camera_name, lambda record: record.update(fields))
+
+
+def _update_record(camera_name, update, create=True):
+    # Read-modify-write of one record under the write lock
+    conn = _connect()
+    with _write_transaction(conn):
+        row = conn.execute("SELECT data FROM calibrations WHERE camera_name = ?", (camera_name,)).fetchone()
+        if row is None and not create:
+            raise ValueError(f"Camera '{camera_name}' is not calibrated.")
+        record = json.loads(row[0]) if row else {}
+        update(record)
+        conn.execute(
+            "INSERT OR REPLACE INTO calibrations (camera_name, data, updated) VALUES (?, ?, ?)",
+            (camera_name, json.dumps(record), time.time())
+        )
+    _invalidate_models()
+
+
+def set_detector(camera_name, image_size, detector):
+    """
+    Remember the board detector backend to use for one camera at one resolution.
+
+    Choices for other resolutions are kept. The camera must be calibrated.
+    """
+    w, h = image_size
+
+    def update(record):
+        record.setdefault("detectors", {})[f"{w}x{h}"] = detector
+
+    _update_record(camera_name, update, create=False)
+
+
+def delete_calibration(camera_name):
+    conn = _connect()
+    with _write_transaction(conn):
+        conn.execute("DELETE FROM calibrations WHERE camera_name = ?", (camera_name,))
+    _invalidate_models()
+
+
+def import_json(path=CALIB_DB):
+    """Add (or replace) the calibrations of a JSON file in the store."""
+    _import_records(_connect(), _read_json(path))
+
+
+def export_json(path=CALIB_DB):
+    """Write every calibration to a JSON file, in the historical calibration_db.json format."""
+    with file_lock(path):
+        atomic_write_json(path, load_calibrations(), indent=4)
+
+
+if __name__ == "__main__":
+    # python calibration_db.py import|export [file.json]
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python calibration_db.py import|export [file.json]")
+        sys.exit(1)
+    target = sys.argv[2] if len(sys.argv) > 2 else CALIB_DB
+    if sys.argv[1] == "import":
+        import_json(target)
+    else:
+        export_json(target)
@@ -1,15 +1,134 @@
+import multiprocessing
+import os
+import time
 import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 from glob import glob
-from typing import Tuple, List, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Tuple, List, Optional
+
+import image_io
+from board_detection import (CALIBRATION_DETECTORS, DEFAULT_DETECTOR, BoardPrefilter, ChessboardDetector,
+                             DetectorChoice, Region, detector_name, find_chessboard, get_detector,
+                             match_corner_order)
+from calibration_db import scale_camera_matrix
+from corner_cache import CornerCache
+
+NOT_FOUND = "chessboard not found"
+# Not cached: the fast check is cheap to redo and a random audit may still find the board
+REJECTED = "rejected by the fast board check"
+# Starting from a good guess, the solver can stop as soon as the parameters settle
+# instead of running the default 30 iterations to machine precision
+WARM_START_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_COUNT, 30, 1e-6)
+# Half size of the cornerSubPix window for pixel accurate corners, shrunk to stay inside one square
+SUBPIX_WINDOW = 11
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+# Largest residual of a homography fitted to refined corners, as a fraction of the square spacing.
+# Lens distortion alone stays near 0.02; a corner left on the wrong spot by cornerSubPix is far above.
+GRID_RESIDUAL_RATIO = 0.05
+
+
+class CalibrationCancelled(Exception):
+    """Raised from a progress callback to stop a running detection."""
+
+
+def view_features(corners: np.ndarray, image_size: Tuple[int, int], pattern_size: Tuple[int, int]) -> np.ndarray:
+    """
+    Describe where and how the board appears in a view.
+
+    Args:
+        corners: Detected corners (N x 2 or N x 1 x 2)
+        image_size: (width, height) of the image
+        pattern_size: Number of inner corners per row and column
+
+    Returns:
+        Array (center_x, center_y, scale, tilt_x, tilt_y) with values roughly in [-1, 1]
+    """
+    w, h = image_size
+    grid = corners.reshape(pattern_size[1], pattern_size[0], 2)
+    tl, tr, br, bl = grid[0, 0], grid[0, -1], grid[-1, -1], grid[-1, 0]
+
+    center = grid.reshape(-1, 2).mean(axis=0) / (w, h)
+    area = cv2.contourArea(np.float32([tl, tr, br, bl]))
+    scale = np.sqrt(area / (w * h))
+
+    # A tilted board is foreshortened: its opposite edges no longer have the same length
+    top, bottom = np.linalg.norm(tr - tl), np.linalg.norm(br - bl)
+    left, right = np.linalg.norm(bl - tl), np.linalg.norm(br - tr)
+    tilt_x = 2 * (top - bottom) / (top + bottom)
+    tilt_y = 2 * (left - right) / (left + right)
+
+    return np.array([center[0], center[1], scale, tilt_x, tilt_y])
+
+
+def diverse_subset(features: np.ndarray, count: int) -> List[int]:
+    """
+    Greedily pick views that are as different from each other as possible (farthest point sampling).
+
+    Args:
+        features: M x D array of view features (see view_features)
+        count: Number of views to pick
+
+    Returns:
+        Indices of the chosen views, in the order they were picked
+    """
+    if len(features) == 0:
+        return []
+    # Start from the view closest to the average one, then always add the least covered view
+    chosen = [int(np.argmin(np.linalg.norm(features - features.mean(axis=0), axis=1)))]
+    distances = np.linalg.norm(features - features[chosen[0]], axis=1)
+    while len(chosen) < min(count, len(features)):
+        best = int(np.argmax(distances))
+        chosen.append(best)
+        distances = np.minimum(distances, np.linalg.norm(features - features[best], axis=1))
+    return chosen
+
+
+# Detection-only calibrator of a worker process, see CameraCalibrator._detect_files
+_worker_calibrator = None
+
+
+def _init_detection_worker(settings: dict):
+    global _worker_calibrator
+    _worker_calibrator = CameraCalibrator(**settings)
+
+
+def _detect_file_in_worker(img_path: str):
+    # The prefilter statistics of each image are sent back with its result
+    calibrator = _worker_calibrator
+    if calibrator.prefilter is None:
+        return calibrator._detect_file(img_path), None
+    calibrator.prefilter.stats = dict.fromkeys(calibrator.prefilter.stats, 0)
+    return calibrator._detect_file(img_path), calibrator.prefilter.stats
+
 
 class CameraCalibrator:
-    def __init__(self, square_size: float, pattern_size: Tuple[int, int]):
+    def __init__(self, square_size: float, pattern_size: Tuple[int, int], pyramid_max_dim: Optional[int] = None,
+                 prefilter_max_dim: Optional[int] = None, detector: DetectorChoice = None):
         self.square_size = square_size
         self.pattern_size = pattern_size
+        # Board detector backend: a name of board_detection.CALIBRATION_DETECTORS, or one per resolution {"WxH": name}
+        names = [] if detector is None else [detector] if isinstance(detector, str) else list(detector.values())
+        for name in names:
+            if name not in CALIBRATION_DETECTORS:
+                raise ValueError(f"Detector '{name}' cannot be used for calibration, "
+                                 f"expected one of {', '.join(CALIBRATION_DETECTORS)}.")
+        self.detector = detector
+        # When set, the board is searched on a copy downscaled to this size and refined at full resolution
+        self.pyramid_max_dim = pyramid_max_dim
+        # When set, images failing a fast board check on a copy of this size are rejected without a full search
+        self.prefilter = BoardPrefilter(pattern_size, prefilter_max_dim) if prefilter_max_dim else None
         self.camera_matrix = None
         self.dist_coefs = None
+        self.rms = None
+        self.image_size = None
+        # Resolution of intrinsics loaded with load_intrinsics, rescaled before a warm start if needed
+        self._intrinsics_size = None
+        # Per-view observations kept for incremental recalibration: (path, corners)
+        self.views = []
+        self.rvecs = None
+        self.tvecs = None
         self._pattern_points = self._create_pattern_points()
 
     def _create_pattern_points(self) -> np.ndarray:
@@ -18,13 +137,17 @@ class CameraCalibrator:
         pattern_points *= self.square_size
         return pattern_points
 
-    def calibrate_from_images(self, img_mask: str, visualize: bool = True) -> Tuple[float, np.ndarray, np.ndarray]:
+    def calibrate_from_images(self, img_mask: str, visualize: bool = True,
+                              workers: Optional[int] = None) -> Tuple[float, np.ndarray, np.ndarray]:
         img_names = glob(img_mask)
+        if not visualize:
+            rms, camera_matrix, dist_coefs, _failures = self.calibrate_from_files(img_names, workers)
+            return rms, camera_matrix, dist_coefs
+
         obj_points = []
         img_points = []
 
-        if visualize:
-            plt.figure(figsize=(20, 20))
+        plt.figure(figsize=(20, 20))
 
         for i, fn in enumerate(img_names):
             success, corners = self._process_image(fn, i, visualize)
@@ -32,32 +155,552 @@ class CameraCalibrator:
                 img_points.append(corners)
                 obj_points.append(self._pattern_points)
 
-        if visualize:
-            plt.show()
+        plt.show()
 
-        h, w = cv2.imread(img_names[0]).shape[:2]
+        w, h = image_io.read_size(img_names[0])
         rms, self.camera_matrix, self.dist_coefs, _rvecs, _tvecs = cv2.calibrateCamera(
             obj_points, img_points, (w, h), None, None
         )
         return rms, self.camera_matrix, self.dist_coefs
 
-    def _process_image(self, img_path: str, index: int, visualize: bool) -> Tuple[bool, Optional[np.ndarray]]:
+    def calibrate_from_files(self, img_paths: List[str], workers: Optional[int] = None,
+                             cache: Optional[CornerCache] = None,
+                             progress: Optional[Callable[[int, int], None]] = None
+                             ) -> Tuple[float, np.ndarray, np.ndarray, List[Tuple[str, str]]]:
+        """
+        Detect the chessboard in every image (in parallel) and calibrate the camera.
+
+        Args:
+            img_paths: Paths of the calibration images
+            workers: Number of detection processes (None uses every core)
+            cache: Optional corner cache, only images missing from it are processed
+            progress: Optional callback receiving (images_done, image_count), see detect_corners
+
+        Returns:
+            Tuple of (rms, camera_matrix, dist_coefs, failures) where failures lists
+            (path, reason) for every image that could not be used
+        """
+        self.views = []
+        self.image_size = None
+        failures = self._collect_views(img_paths, workers, cache, progress)
+        self._solve(warm_start=False)
+        return self.rms, self.camera_matrix, self.dist_coefs, failures
+
+    def load_intrinsics(self, camera_matrix: np.ndarray, dist_coefs: np.ndarray,
+                        image_size: Optional[Tuple[int, int]] = None):
+        """
+        Seed the calibrator with existing intrinsics (e.g. from calibration_db),
+        used as the initial guess by add_views. When image_size (the resolution
+        of these intrinsics) is given, they are rescaled to the size of the views.
+        """
+        self.camera_matrix = np.array(camera_matrix, dtype=np.float64)
+        self.dist_coefs = np.array(dist_coefs, dtype=np.float64)
+        self._intrinsics_size = tuple(image_size) if image_size else None
+
+    def add_views(self, img_paths: List[str], workers: Optional[int] = None,
+                  cache: Optional[CornerCache] = None,
+                  progress: Optional[Callable[[int, int], None]] = None
+                  ) -> Tuple[float, np.ndarray, np.ndarray, List[Tuple[str, str]]]:
+        """
+        Add calibration images and refine the current calibration.
+
+        Only images that are not already part of the views are detected. The
+        solve starts from the current camera_matrix/dist_coefs, so refining an
+        existing camera converges in a few iterations.
+
+        Args:
+            img_paths: Paths of the calibration images (already known paths are skipped)
+            workers: Number of detection processes (None uses every core)
+            cache: Optional corner cache
+            progress: Optional callback receiving (images_done, image_count), see detect_corners
+
+        Returns:
+            Tuple of (rms, camera_matrix, dist_coefs, failures)
+        """
+        known = set(self.view_paths())
+        new_paths = [fn for fn in dict.fromkeys(img_paths) if fn not in known]
+        failures = self._collect_views(new_paths, workers, cache, progress)
+        self._solve(warm_start=self.camera_matrix is not None)
+        return self.rms, self.camera_matrix, self.dist_coefs, failures
+
+    def add_corner_views(self, views: List[Tuple[str, np.ndarray]], image_size: Tuple[int, int]
+                         ) -> Tuple[float, np.ndarray, np.ndarray]:
+        """
+        Add views whose corners were detected elsewhere (e.g. video frames) and refine the calibration.
+
+        Args:
+            views: List of (name, corners) observations, corners being N x 2 pixel coordinates
+            image_size: (width, height) of the frames the corners come from
+
+        Returns:
+            Tuple of (rms, camera_matrix, dist_coefs)
+        """
+        if self.image_size is None:
+            self.image_size = tuple(image_size)
+        elif tuple(image_size) != self.image_size:
+            raise ValueError(f"Frame size {tuple(image_size)} differs from {self.image_size}.")
+
+        known = set(self.view_paths())
+        self.views.extend((name, corners.reshape(-1, 2)) for name, corners in views if name not in known)
+        self._solve(warm_start=self.camera_matrix is not None)
+        return self.rms, self.camera_matrix, self.dist_coefs
+
+    def remove_views(self, img_paths: List[str]):
+        """Drop the observations of the given images; the next solve no longer uses them."""
+        removed = set(img_paths)
+        self.views = [view for view in self.views if view[0] not in removed]
+
+    def view_paths(self) -> List[str]:
+        return [fn for fn, _corners in self.views]
+
+    def _collect_views(self, img_paths: List[str], workers: Optional[int], cache: Optional[CornerCache],
+                       progress: Optional[Callable[[int, int], None]]) -> List[Tuple[str, str]]:
+        failures = []
+        results = self.detect_corners(img_paths, workers, cache, progress)
+        for fn, (corners, size, error) in zip(img_paths, results):
+            if error is not None:
+                failures.append((fn, error))
+                continue
+            if self.image_size is None:
+                self.image_size = size
+            elif size != self.image_size:
+                failures.append((fn, f"image size {size} differs from {self.image_size}"))
+                continue
+            self.views.append((fn, corners))
+        return failures
+
+    def _solve(self, warm_start: bool):
+        if not self.views:
+            raise ValueError("Chessboard not found in any calibration image.")
+
+        obj_points = [self._pattern_points] * len(self.views)
+        img_points = [corners for _fn, corners in self.views]
+
+        camera_matrix, dist_coefs, flags = None, None, 0
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_COUNT, 30, np.finfo(float).eps)
+        if warm_start and self._intrinsics_size not in (None, self.image_size):
+            try:
+                self.camera_matrix = scale_camera_matrix(self.camera_matrix, self._intrinsics_size, self.image_size)
+            except ValueError:
+                warm_start = False
+        self._intrinsics_size = None
+        if warm_start and self._guess_fits_image():
+            camera_matrix = self.camera_matrix.copy()
+            dist_coefs = self.dist_coefs.copy()
+            flags = cv2.CALIB_USE_INTRINSIC_GUESS
+            criteria = WARM_START_CRITERIA
+
+        self.rms, self.camera_matrix, self.dist_coefs, self.rvecs, self.tvecs = cv2.calibrateCamera(
+            obj_points, img_points, self.image_size, camera_matrix, dist_coefs, flags=flags, criteria=criteria
+        )
+
+    def _guess_fits_image(self) -> bool:
+        # An intrinsic guess from another resolution would start the solver far from the optimum
+        w, h = self.image_size
+        cx, cy = self.camera_matrix[0, 2], self.camera_matrix[1, 2]
+        return 0 < cx < w and 0 < cy < h
+
+    def per_view_errors(self) -> np.ndarray:
+        """
+        RMS reprojection error (pixels) of every view with the current calibration.
+        """
+        if self.rvecs is None or len(self.rvecs) != len(self.views):
+            raise ValueError("Calibration not up to date. Call add_views or calibrate_from_files first.")
+        errors = []
+        for (_fn, corners), rvec, tvec in zip(self.views, self.rvecs, self.tvecs):
+            projected, _ = cv2.projectPoints(self._pattern_points, rvec, tvec, self.camera_matrix, self.dist_coefs)
+            errors.append(np.sqrt(np.mean(np.sum((projected.reshape(-1, 2) - corners) ** 2, axis=1))))
+        return np.array(errors)
+
+    def select_views(self, target_rms: Optional[float] = None, coverage: float = 0.95,
+                     outlier_factor: float = 3.0, min_views: int = 6) -> Tuple[List[str], dict]:
+        """
+        Keep the smallest set of views that calibrates the camera as well as all of them.
+
+        Views whose error exceeds outlier_factor times the median are dropped first. The
+        remaining views are added in order of diversity (see diverse_subset) until the
+        subset covers enough of the image and its intrinsics reproject every inlier view
+        with an RMS error below target_rms. The calibrator then keeps only the chosen views.
+
+        Args:
+            target_rms: Reprojection error to reach on all inlier views (defaults to 5% above the full solve)
+            coverage: Fraction of the image cells covered by all inlier views the subset must cover
+            outlier_factor: Per-view error threshold, relative to the median error
+            min_views: Smallest subset size tried
+
+        Returns:
+            Tuple of (selected view paths, report) where the report gives the view counts,
+            the cold solve times of all views and of the subset, the time the whole
+            selection took and its net cost. The selection itself runs many solves:
+            it only pays off over later solves of the subset (see break_even_solves).
+        """
+        selection_start = time.perf_counter()
+        start = time.perf_counter()
+        self._solve(warm_start=False)
+        full_time = time.perf_counter() - start
+
+        errors = self.per_view_errors()
+        inliers = [view for view, error in zip(self.views, errors) if error <= outlier_factor * np.median(errors)]
+        if len(inliers) < len(self.views):
+            self.views = inliers
+            self._solve(warm_start=False)
+        if target_rms is None:
+            target_rms = 1.05 * self.rms
+
+        features = np.array([view_features(corners, self.image_size, self.pattern_size) for _fn, corners in inliers])
+        order = diverse_subset(features, len(inliers))
+        target_cells = coverage * self._coverage(inliers)
+
+        all_views = self.views
+        size = min(min_views, len(order))
+        while True:
+            self.views = [inliers[i] for i in order[:size]]
+            self._solve(warm_start=size > min_views)
+            if size == len(order) or (self._coverage(self.views) >= target_cells
+                                      and self._holdout_rms(all_views) <= target_rms):
+                break
+            size += 1
+
+        # Time a cold solve of the subset to compare like with like
+        start = time.perf_counter()
+        self._solve(warm_start=False)
+        subset_time = time.perf_counter() - start
+        selection_time = time.perf_counter() - selection_start
+
+        saved_per_solve = full_time - subset_time
+        report = {
+            "views_total": len(errors),
+            "outliers": len(errors) - len(inliers),
+            "views_selected": len(self.views),
+            "rms": self.rms,
+            "full_solve_time": full_time,
+            "subset_solve_time": subset_time,
+            # Everything select_views did, the full solve and the subset solve included
+            "selection_time": selection_time,
+            # Extra time spent compared to a single solve of all views (negative when it was faster)
+            "net_cost": selection_time - full_time,
+            "saved_per_solve": saved_per_solve,
+            # Later solves of the subset needed to recover the net cost, None if they are not faster
+            "break_even_solves": (max(0, int(np.ceil((selection_time - full_time) / saved_per_solve)))
+                                  if saved_per_solve > 0 else None)
+        }
+        return self.view_paths(), report
+
+    def _holdout_rms(self, views: List[Tuple[str, np.ndarray]]) -> float:
+        # Pose every view with the current intrinsics and measure how well they fit
+        squared = []
+        for _fn, corners in views:
+            _ok, rvec, tvec = cv2.solvePnP(self._pattern_points, corners, self.camera_matrix, self.dist_coefs)
+            projected, _ = cv2.projectPoints(self._pattern_points, rvec, tvec, self.camera_matrix, self.dist_coefs)
+            squared.append(np.sum((projected.reshape(-1, 2) - corners) ** 2, axis=1))
+        return float(np.sqrt(np.mean(np.concatenate(squared))))
+
+    def _coverage(self, views: List[Tuple[str, np.ndarray]], grid: Tuple[int, int] = (8, 6)) -> int:
+        # Number of cells of a coarse image grid that contain at least one corner
+        w, h = self.image_size
+        points = np.concatenate([corners for _fn, corners in views])
+        cols = np.clip((points[:, 0] * grid[0] / w).astype(int), 0, grid[0] - 1)
+        rows = np.clip((points[:, 1] * grid[1] / h).astype(int), 0, grid[1] - 1)
+        return len(np.unique(rows * grid[0] + cols))
+
+    def detect_corners(self, img_paths: List[str], workers: Optional[int] = None,
+                       cache: Optional[CornerCache] = None,
+                       progress: Optional[Callable[[int, int], None]] = None
+                       ) -> List[Tuple[Optional[np.ndarray], Optional[Tuple[int, int]], Optional[str]]]:
+        """
+        Run chessboard detection on a list of images, fanning out over a process pool.
+
+        Args:
+            img_paths: Paths of the images to process
+            workers: Number of worker processes (None uses every core, 1 runs serially)
+            cache: Optional corner cache; hits skip detection and new results are stored
+            progress: Optional callback receiving (images_done, image_count) as images complete.
+                It may raise CalibrationCancelled to stop: pending images are then dropped.
+
+        Returns:
+            One (corners, image_size, error) tuple per image, in the order of img_paths.
+            corners is None and error holds the reason when detection failed.
+        """
+        results = [None] * len(img_paths)
+        keys = [None] * len(img_paths)
+        if cache is not None:
+            detector_key = self._detector_key()
+            for i, fn in enumerate(img_paths):
+                try:
+                    keys[i] = cache.key(fn, detector_key)
+                except OSError as e:
+                    results[i] = (None, None, str(e))
+                    continue
+                results[i] = cache.get(keys[i])
+
+        todo = [i for i, result in enumerate(results) if result is None]
+        if progress is not None:
+            cached = len(img_paths) - len(todo)
+            progress(cached, len(img_paths))
+            detect_progress = lambda done, _total: progress(cached + done, len(img_paths))
+        else:
+            detect_progress = None
+
+        for i, result in zip(todo, self._detect_files([img_paths[i] for i in todo], workers, detect_progress)):
+            results[i] = result
+            corners, size, error = result
+            # Read errors and prefilter rejections (REJECTED) are tried again next time
+            if cache is not None and (error is None or error == NOT_FOUND):
+                cache.put(keys[i], corners, size, error)
+
+        if cache is not None:
+            cache.save()
+        return results
+
+    def _detect_files(self, img_paths: List[str], workers: Optional[int],
+                      progress: Optional[Callable[[int, int], None]] = None
+                      ) -> List[Tuple[Optional[np.ndarray], Optional[Tuple[int, int]], Optional[str]]]:
+        if not img_paths:
+            return []
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(img_paths)))
+
+        if workers == 1:
+            results = []
+            for fn in img_paths:
+                results.append(self._detect_file(fn))
+                if progress is not None:
+                    progress(len(results), len(img_paths))
+            return results
+
+        results = [None] * len(img_paths)
+        # Spawned, not forked: this may run from a background thread of the GUI while other threads
+        # (capture server) are active. Workers only receive the detection settings, never the views.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_detection_worker, initargs=(self._detection_settings(),)) as pool:
+            futures = {pool.submit(_detect_file_in_worker, fn): i for i, fn in enumerate(img_paths)}
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    results[futures[future]], prefilter_stats = future.result()
+                    if prefilter_stats is not None:
+                        self.prefilter.merge(prefilter_stats)
+                    if progress is not None:
+                        progress(done, len(img_paths))
+            except BaseException:
+                # Images already being processed finish, the others are dropped
+                for future in futures:
+                    future.cancel()
+                raise
+        return results
+
+    def _detector_key(self) -> str:
+        """Identify the detection settings that influence the corners found."""
+        prefilter = self.prefilter.max_dim if self.prefilter is not None else None
+        key = f"{self.pattern_size[0]}x{self.pattern_size[1]}|pyramid={self.pyramid_max_dim}|prefilter={prefilter}"
+        if self.detector not in (None, DEFAULT_DETECTOR):
+            choice = self.detector if isinstance(self.detector, str) else sorted(self.detector.items())
+            key += f"|detector={choice}"
+        return key
+
+    def _detection_settings(self) -> dict:
+        """Constructor arguments of a calibrator detecting corners like this one."""
+        return dict(square_size=self.square_size, pattern_size=tuple(self.pattern_size),
+                    pyramid_max_dim=self.pyramid_max_dim,
+                    prefilter_max_dim=self.prefilter.max_dim if self.prefilter is not None else None,
+                    detector=self.detector)
+
+    def _detect_file(self, img_path: str) -> Tuple[Optional[np.ndarray], Optional[Tuple[int, int]], Optional[str]]:
+        try:
+            img = image_io.read_gray(img_path, cache=False)
+            if img is None:
+                return None, None, "failed to load"
+
+            h, w = img.shape[:2]
+            rejected = self.prefilter.stats["rejected"] if self.prefilter is not None else 0
+            corners = self._find_corners(img)
+            if corners is None:
+                if self.prefilter is not None and self.prefilter.stats["rejected"] != rejected:
+                    return None, (w, h), REJECTED
+                return None, (w, h), NOT_FOUND
+            return corners.reshape(-1, 2), (w, h), None
+        except Exception as e:
+            return None, None, str(e)
+
+    def _find_corners(self, gray: np.ndarray, prior: Optional[Region] = None,
+                      refine: bool = True) -> Optional[np.ndarray]:
+        # refine=False skips cornerSubPix (and the grid check of pyramid corners), for benchmarks
+        backend = get_detector(detector_name(self.detector, gray.shape), tuple(self.pattern_size))
+        finder = lambda image: self._search_corners(image, backend, refine)
+        search = lambda image: find_chessboard(image, self.pattern_size, prior, finder)
+        if self.prefilter is None or backend.partial_boards:
+            return search(gray)
+        return self.prefilter.run(gray, search)
+
+    def _search_corners(self, gray: np.ndarray, backend: Optional[ChessboardDetector] = None,
+                        refine: bool = True) -> Optional[np.ndarray]:
+        if backend is None:
+            backend = get_detector(DEFAULT_DETECTOR, tuple(self.pattern_size))
+        h, w = gray.shape[:2]
+        if self.pyramid_max_dim and max(h, w) > self.pyramid_max_dim:
+            corners = self._find_corners_pyramid(gray, self.pyramid_max_dim / max(h, w), backend, refine)
+            if corners is not None:
+                return corners
+
+        return self._find_corners_full(gray, backend, refine)
+
+    def _find_corners_full(self, gray: np.ndarray, backend: ChessboardDetector,
+                           refine: bool = True) -> Optional[np.ndarray]:
+        # Search at full resolution; pixel accurate corners are refined like the pyramid ones
+        corners = backend.find(gray)
+        if corners is None or backend.subpixel or not refine:
+            return corners
+        return self._refine_corners(gray, corners)
+
+    def _find_corners_pyramid(self, gray: np.ndarray, scale: float, backend: Optional[ChessboardDetector] = None,
+                              refine: bool = True) -> Optional[np.ndarray]:
+        """
+        Find the board on a downscaled copy, then refine the corners at full resolution.
+
+        Args:
+            gray: Full resolution grayscale image
+            scale: Downscaling factor (< 1)
+            backend: Detector backend (default: the classic detector)
+            refine: When False, the coarse corners are only mapped to full resolution
+
+        Returns:
+            Refined corners in full resolution pixel coordinates, or None if not found
+            or if the refined grid is inconsistent (see _refine_coarse_corners)
+        """
+        if backend is None:
+            backend = get_detector(DEFAULT_DETECTOR, tuple(self.pattern_size))
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        corners = backend.find(small)
+        if corners is None:
+            return None
+        if not refine:
+            return ((corners + 0.5) / scale - 0.5).astype(np.float32)
+        return self._refine_coarse_corners(gray, corners, scale)
+
+    def _refine_coarse_corners(self, gray: np.ndarray, corners: np.ndarray, scale: float) -> Optional[np.ndarray]:
+        """
+        Refine corners found on a copy downscaled by scale at full resolution.
+
+        A coarse corner can be several pixels of the small copy away from the
+        true one; cornerSubPix then leaves it on a wrong spot without any error.
+        The refined grid is therefore checked against a homography.
+
+        Returns:
+            Refined corners, or None when they do not form a consistent grid
+            (callers then search at full resolution)
+        """
+        # Map pixel centres back to the full resolution grid
+        corners = ((corners + 0.5) / scale - 0.5).astype(np.float32)
+        refined = self._refine_corners(gray, corners)
+        return refined if self._grid_residual(refined) <= GRID_RESIDUAL_RATIO * self._square_spacing(refined) else None
+
+    def _refine_corners(self, gray: np.ndarray, corners: np.ndarray, win: int = SUBPIX_WINDOW) -> np.ndarray:
+        """
+        Refine corners with cornerSubPix, the half window win being shrunk to stay inside one square.
+        """
+        corners = corners.reshape(-1, 1, 2).astype(np.float32)
+        win = int(max(2, min(win, self._square_spacing(corners) / 2 - 1)))
+        return cv2.cornerSubPix(gray, corners, (win, win), (-1, -1), SUBPIX_CRITERIA)
+
+    def _square_spacing(self, corners: np.ndarray) -> float:
+        # Shortest distance between neighbouring corners, in pixels
+        grid = corners.reshape(self.pattern_size[1], self.pattern_size[0], 2)
+        return float(min(np.linalg.norm(np.diff(grid, axis=1), axis=2).min(),
+                         np.linalg.norm(np.diff(grid, axis=0), axis=2).min()))
+
+    def _grid_residual(self, corners: np.ndarray) -> float:
+        # Largest distance (pixels) between the corners and a homography of the pattern grid fitted to them
+        grid = self._pattern_points[:, :2].astype(np.float32)
+        corners = corners.reshape(-1, 2).astype(np.float32)
+        H, _ = cv2.findHomography(grid, corners)
+        if H is None:
+            return np.inf
+        projected = cv2.perspectiveTransform(grid[:, None, :], H).reshape(-1, 2)
+        return float(np.linalg.norm(projected - corners, axis=1).max())
+
+    def benchmark_pyramid(self, img_paths: List[str], prior: Optional[Region] = None
+                          ) -> List[Tuple[str, float, float, float, Optional[float]]]:
+        """
+        Compare full resolution and pyramid detection on each image.
+
+        Both paths use the detector backend of the calibrator and end with the
+        corners used for calibration: subpixel corners at full resolution (the
+        full resolution corners of a pixel accurate backend get cornerSubPix).
+        The corner shift therefore compares like with like.
+
+        Args:
+            img_paths: Paths of the images to compare
+            prior: Optional (x, y, width, height) region where the board is expected,
+                searched (padded) before the full image by both paths
+
+        Returns:
+            One (path, full_time, pyramid_time, speedup, max_corner_shift) tuple per image.
+            max_corner_shift (pixels) is None when either path did not find the board.
+        """
+        if not self.pyramid_max_dim:
+            raise ValueError("pyramid_max_dim must be set to benchmark the pyramid mode.")
+
+        def pyramid_search(image, backend):
+            return self._find_corners_pyramid(image, min(1.0, self.pyramid_max_dim / max(image.shape[:2])), backend)
+
+        report = []
+        for fn in img_paths:
+            gray = image_io.read_gray(fn, cache=False)
+            if gray is None:
+                print(f"Failed to load {fn}")
+                continue
+            backend = get_detector(detector_name(self.detector, gray.shape), tuple(self.pattern_size))
+
+            start = time.perf_counter()
+            full = find_chessboard(gray, self.pattern_size, prior, lambda image: self._find_corners_full(image, backend))
+            full_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            pyramid = find_chessboard(gray, self.pattern_size, prior, lambda image: pyramid_search(image, backend))
+            pyramid_time = time.perf_counter() - start
+
+            shift = None
+            if full is not None and pyramid is not None:
+                # The two searches may report a symmetric board from different corners
+                pyramid = match_corner_order(pyramid, full, self.pattern_size)
+                shift = float(np.abs(full.reshape(-1, 2) - pyramid).max())
+            speedup = full_time / pyramid_time if pyramid_time > 0 else float("inf")
+            print(f"{fn}: full {full_time:.3f}s, pyramid {pyramid_time:.3f}s, x{speedup:.1f}")
+            report.append((fn, full_time, pyramid_time, speedup, shift))
+        return report
+
+    def _process_image(self, img_path: str, index: int, visualize: bool,
+                       prior: Optional[Region] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Detect the board in one image, optionally showing it.
+
+        Args:
+            img_path: Path of the image
+            index: Position of the image, the first 12 are shown when visualize is set
+            visualize: Plot the detected corners
+            prior: Optional (x, y, width, height) region where the board is expected,
+                searched (padded) before the full image
+
+        Returns:
+            Tuple of (success, corners)
+        """
         print(f"Processing {img_path}...")
-        imgBGR = cv2.imread(img_path)
-        if imgBGR is None:
+        show = visualize and index < 12
+        # Only decode the colour image when it is going to be displayed
+        img = image_io.read_color(img_path) if show else image_io.read_gray(img_path, cache=False)
+        if img is None:
             print(f"Failed to load {img_path}")
             return False, None
 
-        imgRGB = cv2.cvtColor(imgBGR, cv2.COLOR_BGR2RGB)
-        img = cv2.cvtColor(imgRGB, cv2.COLOR_RGB2GRAY)
-
-        found, corners = cv2.findChessboardCorners(img, self.pattern_size)
-        if not found:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if show else img
+        corners = self._find_corners(gray, prior)
+        if corners is None:
             print("Chessboard not found")
             return False, None
 
-        if visualize and index < 12:
-            img_w_corners = cv2.drawChessboardCorners(imgRGB, self.pattern_size, corners, found)
+        if show:
+            imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+            img_w_corners = cv2.drawChessboardCorners(imgRGB, self.pattern_size, corners, True)
             plt.subplot(4, 3, index + 1)
             plt.imshow(img_w_corners)
 
@@ -0,0 +1,109 @@
+import json
+import os
+import time
+import numpy as np
+from typing import Optional, Tuple
+
+from calibration_db import DATA_DIR, atomic_write_json, file_lock
+from image_io import file_digest
+
+CORNER_CACHE = os.path.join(DATA_DIR, "corner_cache.json")
+
+
+class JsonCache:
+    """
+    JSON file of entries keyed by image content, shared between processes.
+
+    Every entry carries a last_used timestamp. The least recently used entries
+    are evicted once max_entries is exceeded.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = self._load()
+        self._dirty = False
+
+    def _load(self) -> dict:
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                print(f"Ignoring unreadable cache {self.path}")
+        return {}
+
+    @staticmethod
+    def key(img_path: str, settings_key: str) -> str:
+        return f"{file_digest(img_path)}|{settings_key}"
+
+    def _get_entry(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry["last_used"] = time.time()
+            self._dirty = True
+        return entry
+
+    def _put_entry(self, key: str, entry: dict):
+        entry["last_used"] = time.time()
+        self._entries[key] = entry
+        self._dirty = True
+
+    def save(self):
+        """
+        Write the cache. Entries saved meanwhile by other processes are merged in,
+        the most recently used version of an entry wins.
+        """
+        if not self._dirty:
+            return
+        with file_lock(self.path):
+            for key, entry in self._load().items():
+                mine = self._entries.get(key)
+                if mine is None or entry["last_used"] > mine["last_used"]:
+                    self._entries[key] = entry
+
+            if len(self._entries) > self.max_entries:
+                by_age = sorted(self._entries, key=lambda k: self._entries[k]["last_used"])
+                for key in by_age[:len(self._entries) - self.max_entries]:
+                    del self._entries[key]
+
+            atomic_write_json(self.path, self._entries)
+        self._dirty = False
+
+
+class CornerCache(JsonCache):
+    """
+    On-disk cache of chessboard detection results.
+
+    Entries are keyed by image content and detector settings, so a file that
+    is renamed keeps its entry and a change of pattern size or detector mode
+    never returns stale corners. Failed detections are cached as well.
+    """
+
+    def __init__(self, path: str = CORNER_CACHE, max_entries: int = 5000):
+        super().__init__(path, max_entries)
+
+    def get(self, key: str) -> Optional[Tuple[Optional[np.ndarray], Optional[Tuple[int, int]], Optional[str]]]:
+        """
+        Look up a detection result.
+
+        Returns:
+            (corners, image_size, error) as returned by CameraCalibrator.detect_corners,
+            or None on a cache miss
+        """
+        entry = self._get_entry(key)
+        if entry is None:
+            return None
+        corners = entry["corners"]
+        if corners is not None:
+            corners = np.array(corners, dtype=np.float32)
+        size = tuple(entry["image_size"]) if entry["image_size"] is not None else None
+        return corners, size, entry["error"]
+
+    def put(self, key: str, corners: Optional[np.ndarray], image_size: Optional[Tuple[int, int]],
+            error: Optional[str]):
+        self._put_entry(key, {
+            "corners": corners.tolist() if corners is not None else None,
+            "image_size": list(image_size) if image_size is not None else None,
+            "error": error
+        })
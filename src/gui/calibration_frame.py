@@ -3,15 +3,16 @@ import shutil
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from tkinter import filedialog, messagebox
-import cv2
 import numpy as np
 import qrcode
 from PIL import Image, ImageTk
 import threading
 
-from calibration_db import save_calibration, load_calibrations
+from calibration_db import save_calibration, get_camera_model
 from capture_server import start_capture_server_in_thread, get_local_ip
-from camera_calibration import CameraCalibrator 
+from camera_calibration import CameraCalibrator, CalibrationCancelled
+from corner_cache import CornerCache
+from video_calibration import VideoFrameSelector
 
 # Compute the project root (three levels up)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -55,12 +56,15 @@ class CalibrationFrame(tb.Frame):
         action_buttons_frame.columnconfigure(0, weight=1)
         action_buttons_frame.columnconfigure(1, weight=1)
         action_buttons_frame.columnconfigure(2, weight=1)
+        action_buttons_frame.columnconfigure(3, weight=1)
         tb.Button(action_buttons_frame, text="Select Calibration Images", command=self.select_calib_images, bootstyle="primary")\
             .grid(row=0, column=0, sticky="ew", padx=3, pady=3)
         tb.Button(action_buttons_frame, text="Capture Images from Phone", command=self.start_capture_server, bootstyle="success")\
             .grid(row=0, column=1, sticky="ew", padx=3, pady=3)
         tb.Button(action_buttons_frame, text="Refresh Captured Images", command=self.load_captured_images, bootstyle="warning")\
             .grid(row=0, column=2, sticky="ew", padx=3, pady=3)
+        self.video_button = tb.Button(action_buttons_frame, text="Calibrate from Video", command=self.calibrate_from_video, bootstyle="info")
+        self.video_button.grid(row=0, column=3, sticky="ew", padx=3, pady=3)
         
         # Colonne de droite : Affichage du QR Code
         self.qr_frame = tb.Labelframe(top_frame, text="QR Code", bootstyle="info")
@@ -92,13 +96,22 @@ class CalibrationFrame(tb.Frame):
         bottom_frame.columnconfigure(0, weight=1)
         self.status_label = tb.Label(bottom_frame, text="0 images validées pour calibration.", font=("Segoe UI", 12))
         self.status_label.grid(row=0, column=0, sticky="w", padx=5, pady=5)
-        tb.Button(bottom_frame, text="Calibrate Camera", command=self.calibrate_camera, bootstyle="success-outline")\
-            .grid(row=0, column=1, sticky="e", padx=5, pady=5)
+        self.progress_bar = tb.Progressbar(bottom_frame, mode="determinate", bootstyle="success-striped", length=250)
+        self.progress_bar.grid(row=0, column=1, sticky="e", padx=5, pady=5)
+        self.cancel_button = tb.Button(bottom_frame, text="Cancel", command=self.cancel_calibration,
+                                       bootstyle="danger-outline", state="disabled")
+        self.cancel_button.grid(row=0, column=2, sticky="e", padx=5, pady=5)
+        self.calibrate_button = tb.Button(bottom_frame, text="Calibrate Camera", command=self.calibrate_camera, bootstyle="success-outline")
+        self.calibrate_button.grid(row=0, column=3, sticky="e", padx=5, pady=5)
         
         # Variables internes
         self.calib_files = []  # Liste des images sélectionnées pour la calibration
         self.thumbnail_images = {}  # Références vers les PhotoImage pour éviter le garbage collector
         self.current_camera_folder = None
+        self.corner_cache = CornerCache()  # Coins déjà détectés, réutilisés d'une calibration à l'autre
+        self.calibrators = {}  # Calibrateurs conservés par caméra pour recalibrer de façon incrémentale
+        self.calibration_thread = None  # Calibration en cours d'exécution en arrière-plan
+        self.cancel_event = threading.Event()
         
     def on_canvas_configure(self, event):
         # Largeur disponible dans le canvas
@@ -217,24 +230,137 @@ class CalibrationFrame(tb.Frame):
             messagebox.showerror("Error", "Aucune image validée pour la calibration.")
             return
         
-        calibrator = CameraCalibrator(square_size, pattern_size)
-        obj_points = []
-        img_points = []
-        for i, file in enumerate(self.calib_files):
-            success, corners = calibrator._process_image(file, i, visualize=False)
-            if success:
-                img_points.append(corners)
-                obj_points.append(calibrator._pattern_points)
-        if len(obj_points) < 1:
-            messagebox.showerror("Error", "Calibration échouée : aucune image valide.")
+        key = (camera_name, square_size, pattern_size)
+        calibrator = self.calibrators.get(key)
+        if calibrator is None:
+            existing = get_camera_model(camera_name)
+            try:
+                # Détecteur choisi pour cette caméra (batch_calibrate --detector auto), sinon le détecteur classique
+                calibrator = CameraCalibrator(square_size, pattern_size, pyramid_max_dim=1280,
+                                              detector=existing.detectors or None if existing else None)
+            except ValueError as e:
+                # Détecteur enregistré inutilisable pour calibrer (coins complétés)
+                messagebox.showerror("Error", str(e))
+                return
+            if existing and existing.square_size == square_size and existing.pattern_size == pattern_size:
+                # Partir de la calibration enregistrée plutôt que de zéro
+                calibrator.load_intrinsics(existing.camera_matrix, existing.dist_coefs, existing.image_size)
+            self.calibrators[key] = calibrator
+
+        calib_files = list(self.calib_files)  # La sélection peut changer pendant le calcul
+
+        def job(progress):
+            calibrator.remove_views([fn for fn in calibrator.view_paths() if fn not in calib_files])
+            result = calibrator.add_views(calib_files, cache=self.corner_cache, progress=progress)
+            ret, camera_matrix, dist_coefs, failures = result
+            save_calibration(camera_name, camera_matrix, dist_coefs, square_size, pattern_size,
+                             calibrator.image_size)
+            return result
+
+        def done(result):
+            ret, camera_matrix, dist_coefs, failures = result
+            message = f"Caméra '{camera_name}' calibrée et enregistrée."
+            if failures:
+                rejected = "\n".join(f"{os.path.basename(fn)} : {reason}" for fn, reason in failures)
+                message += f"\n\n{len(failures)} image(s) ignorée(s) :\n{rejected}"
+            messagebox.showinfo("Succès", message)
+
+        self.run_calibration_job(job, done, "Détection")
+
+    def calibrate_from_video(self):
+        camera_name = self.camera_name_entry.get().strip()
+        if not camera_name:
+            messagebox.showerror("Error", "Veuillez renseigner un nom de caméra.")
+            return
+        try:
+            square_size = float(self.square_size_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Taille de carré invalide.")
+            return
+        try:
+            pattern_size = tuple(map(int, self.pattern_size_entry.get().split(',')))
+        except Exception:
+            messagebox.showerror("Error", "Taille du motif invalide. Format attendu : 4,4")
             return
-        img = cv2.imread(self.calib_files[0])
-        h, w = img.shape[:2]
-        ret, camera_matrix, dist_coefs, rvecs, tvecs = cv2.calibrateCamera(
-            obj_points, img_points, (w, h), None, None
+
+        video_path = filedialog.askopenfilename(
+            title="Select Calibration Video",
+            initialdir=self.ensure_camera_folder(camera_name),
+            filetypes=[("Video Files", "*.mp4;*.avi;*.mov;*.webm")]
         )
-        save_calibration(camera_name, camera_matrix, dist_coefs, square_size, pattern_size)
-        messagebox.showinfo("Succès", f"Caméra '{camera_name}' calibrée et enregistrée.")
+        if not video_path:
+            return
+
+        # Les vues sont extraites en mémoire, aucune image n'est écrite sur le disque
+        selector = VideoFrameSelector(CameraCalibrator(square_size, pattern_size))
+
+        def job(progress):
+            result = selector.calibrate(video_path, progress)
+            ret, camera_matrix, dist_coefs, n_views = result
+            save_calibration(camera_name, camera_matrix, dist_coefs, square_size, pattern_size,
+                             selector.calibrator.image_size)
+            return result
+
+        def done(result):
+            ret, camera_matrix, dist_coefs, n_views = result
+            messagebox.showinfo("Succès", f"Caméra '{camera_name}' calibrée à partir de {n_views} vues "
+                                          f"(erreur RMS : {ret:.3f} px) et enregistrée.")
+
+        self.run_calibration_job(job, done, "Lecture vidéo")
+
+    def run_calibration_job(self, job, on_success, step_name):
+        """
+        Run job(progress) in a background thread so the interface stays responsive.
+        Progress and the result are handed back to the Tk thread with after().
+        """
+        if self.calibration_thread is not None and self.calibration_thread.is_alive():
+            messagebox.showwarning("Calibration", "Une calibration est déjà en cours.")
+            return
+
+        self.cancel_event.clear()
+        self.calibrate_button.config(state="disabled")
+        self.video_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.progress_bar.config(value=0)
+
+        def progress(done, total):
+            if self.cancel_event.is_set():
+                raise CalibrationCancelled()
+            self.after(0, self.show_progress, step_name, done, total)
+
+        def run():
+            try:
+                result = job(progress)
+            except CalibrationCancelled:
+                self.after(0, self.finish_calibration_job, None, None, None)
+            except Exception as e:
+                self.after(0, self.finish_calibration_job, None, None, e)
+            else:
+                self.after(0, self.finish_calibration_job, on_success, result, None)
+
+        self.calibration_thread = threading.Thread(target=run, daemon=True)
+        self.calibration_thread.start()
+
+    def show_progress(self, step_name, done, total):
+        self.progress_bar.config(maximum=max(total, 1), value=done)
+        self.status_label.config(text=f"{step_name} : {done}/{total}")
+
+    def cancel_calibration(self):
+        self.cancel_event.set()
+        self.status_label.config(text="Annulation en cours...")
+
+    def finish_calibration_job(self, on_success, result, error):
+        self.calibrate_button.config(state="normal")
+        self.video_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        self.progress_bar.config(value=0)
+        self.update_status_label()
+        if error is not None:
+            messagebox.showerror("Error", f"Calibration échouée : {error}")
+        elif on_success is None:
+            messagebox.showinfo("Calibration", "Calibration annulée.")
+        else:
+            on_success(result)
 
     def start_capture_server(self):
         camera_name = self.camera_name_entry.get().strip()
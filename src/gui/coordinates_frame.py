@@ -8,8 +8,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Button
 
-from calibration_db import load_calibrations
-from real_coordinates import CoordinateTransformer
+import homography_cache
+import image_io
+from calibration_db import get_camera_model, list_cameras
+from map_export import EXPORT_FILETYPES, export_world_map
+from real_coordinates import CoordinateTransformer, WorldMap
 
 class CombinedFrame(tb.Frame):
     def __init__(self, master):
@@ -89,9 +92,7 @@ class CombinedFrame(tb.Frame):
         self.update_camera_choices()
             
     def update_camera_choices(self):
-        calibrations = load_calibrations()
-        cam_names = list(calibrations.keys())
-        self.camera_choice['values'] = cam_names
+        self.camera_choice['values'] = list_cameras()
     
     def select_test_image(self):
         self.test_image_path = filedialog.askopenfilename(
@@ -109,28 +110,24 @@ class CombinedFrame(tb.Frame):
     
     def calculate_coordinates(self):
         # Get camera calibration data
-        calibrations = load_calibrations()
         camera_name = self.camera_choice.get().strip()
-        if not camera_name or camera_name not in calibrations:
+        camera_model = get_camera_model(camera_name) if camera_name else None
+        if camera_model is None:
             messagebox.showerror("Error", "Please select a valid camera calibration.")
             return
-        cam_data = calibrations[camera_name]
-        camera_matrix = np.array(cam_data["camera_matrix"])
-        dist_coefs = np.array(cam_data["dist_coefs"])
-        pattern_size = tuple(cam_data["pattern_size"])
         
         # Ensure a test image has been selected
         if not self.test_image_path:
             messagebox.showerror("Error", "Please select a test image.")
             return
         
-        test_img = cv2.imread(self.test_image_path)
+        test_img = image_io.read_color(self.test_image_path)
         if test_img is None:
             messagebox.showerror("Error", "Could not load the test image.")
             return
         
-        transformer = CoordinateTransformer(camera_matrix, dist_coefs, pattern_size)
-        if not transformer.compute_homography(test_img):
+        transformer = CoordinateTransformer.from_camera_model(camera_model)
+        if not transformer.compute_homography(test_img, homography_cache.default_cache(), self.test_image_path):
             messagebox.showerror("Error", "Failed to compute homography on the test image.")
             return
         
@@ -243,51 +240,44 @@ class CombinedFrame(tb.Frame):
 
     def export_matrix(self):
         # Get camera calibration data
-        calibrations = load_calibrations()
         camera_name = self.camera_choice.get().strip()
-        if not camera_name or camera_name not in calibrations:
+        camera_model = get_camera_model(camera_name) if camera_name else None
+        if camera_model is None:
             messagebox.showerror("Error", "Please select a valid camera calibration.")
             return
-        cam_data = calibrations[camera_name]
-        camera_matrix = np.array(cam_data["camera_matrix"])
-        dist_coefs = np.array(cam_data["dist_coefs"])
-        pattern_size = tuple(cam_data["pattern_size"])
         
         # Ensure a test image has been selected
         if not self.test_image_path:
             messagebox.showerror("Error", "Please select a test image.")
             return
         
-        test_img = cv2.imread(self.test_image_path)
+        test_img = image_io.read_color(self.test_image_path)
         if test_img is None:
             messagebox.showerror("Error", "Could not load the test image.")
             return
         
-        transformer = CoordinateTransformer(camera_matrix, dist_coefs, pattern_size)
-        if not transformer.compute_homography(test_img):
+        transformer = CoordinateTransformer.from_camera_model(camera_model)
+        if not transformer.compute_homography(test_img, homography_cache.default_cache(), self.test_image_path):
             messagebox.showerror("Error", "Failed to compute homography on the test image.")
             return
         
         try:
-            # Create the coordinate matrix (world_coords) using the image dimensions
-            world_coords, _, _ = transformer.create_world_coordinates_map(test_img.shape)
+            # The coordinate matrix is computed tile by tile while it is written, never whole in memory
+            world_map = WorldMap(transformer, test_img.shape)
         except Exception as e:
             messagebox.showerror("Error", f"Error generating coordinate matrix: {e}")
             return
         
         filepath = filedialog.asksaveasfilename(
-            defaultextension=".txt",
-            filetypes=[("Text Files", "*.txt")],
+            defaultextension=".npy",
+            filetypes=EXPORT_FILETYPES,
             title="Save Coordinate Matrix"
         )
         if not filepath:
             return
         
         try:
-            # Convert the matrix to a string and write to file
-            array_str = np.array2string(world_coords, threshold=np.inf, separator=', ')
-            with open(filepath, 'w') as f:
-                f.write(array_str)
+            export_world_map(world_map, filepath)
             messagebox.showinfo("Export Successful", f"Coordinate matrix exported to:\n{filepath}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export matrix: {e}")
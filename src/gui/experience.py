@@ -9,7 +9,9 @@ import math
 from ttkbootstrap.constants import *
 from tkinter import messagebox
 from PIL import Image, ImageTk, ImageDraw
-from calibration_db import load_calibrations
+import homography_cache
+import image_io
+from calibration_db import get_camera_model, list_cameras
 from capture_server import start_capture_server_in_thread, get_local_ip
 from camera_calibration import CameraCalibrator 
 from real_coordinates import CoordinateTransformer
@@ -178,9 +180,7 @@ class Experience(tb.Frame):
         self.update_camera_choices()
     
     def update_camera_choices(self):
-        calibrations = load_calibrations()
-        cam_names = list(calibrations.keys())
-        self.camera_choice['values'] = cam_names
+        self.camera_choice['values'] = list_cameras()
 
     def ensure_camera_folder(self, camera_name):
         if not camera_name:
@@ -321,7 +321,7 @@ class Experience(tb.Frame):
             return
 
         image_path = self.calib_files[0]
-        img = cv2.imread(image_path)
+        img = image_io.read_color(image_path)
         if img is None:
             messagebox.showerror("Erreur", f"Impossible de charger l'image : {image_path}")
             return
@@ -333,22 +333,16 @@ class Experience(tb.Frame):
             return
 
         # Charger les calibrations depuis calibration_db
-        calibrations = load_calibrations()
-        if selected_camera not in calibrations:
+        camera_model = get_camera_model(selected_camera)
+        if camera_model is None:
             messagebox.showerror("Erreur", f"Calibration introuvable pour la caméra '{selected_camera}'.")
             return
 
-        # Récupérer les paramètres de calibration pour la caméra sélectionnée
-        calibration = calibrations[selected_camera]
-        camera_matrix = np.array(calibration["camera_matrix"])  # Assurez-vous que c'est un np.ndarray
-        dist_coefs = np.array(calibration["dist_coefs"])
-        pattern_size = calibration["pattern_size"]  # Par exemple (4, 4) ou (9, 6)
-
-        # Instanciation du CoordinateTransformer avec les paramètres récupérés
-        transformer = CoordinateTransformer(camera_matrix, dist_coefs, pattern_size)
+        # Instanciation du CoordinateTransformer avec les paramètres (tableaux float64 prêts à l'emploi)
+        transformer = CoordinateTransformer.from_camera_model(camera_model)
 
         # Calcul de la matrice d'homographie à partir de l'image (après undistortion)
-        if transformer.compute_homography(img):
+        if transformer.compute_homography(img, homography_cache.default_cache(), image_path):
             # Stocker l'objet pour un usage ultérieur
             self.coordinate_transformer = transformer
             print(self.coordinate_transformer.H_inv)
@@ -543,7 +537,7 @@ class Experience(tb.Frame):
             _, thresh_diff = cv2.threshold(gray_diff, threshold, 255, cv2.THRESH_BINARY)
             contours, _ = cv2.findContours(thresh_diff, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             highlighted = f1.copy()
-            object_centers = []
+            pixel_centers = []
             for contour in contours:
                 if cv2.contourArea(contour) > 100:
                     x, y, w, h = cv2.boundingRect(contour)
@@ -552,19 +546,25 @@ class Experience(tb.Frame):
                     if M["m00"] != 0:
                         cx = M["m10"] / M["m00"]
                         cy = M["m01"] / M["m00"]
-                        # Convert pixel coordinates to real-world coordinates if a transformation is provided.
-                        if self.coordinate_transformer.H_inv is not None:
-                            pt = np.array([[[cx, cy]]], dtype=np.float32)
-                            world_pt = cv2.perspectiveTransform(pt, self.coordinate_transformer.H_inv)
-                            cx, cy = world_pt[0][0]
-                        object_centers.append((cx, cy))
+                        pixel_centers.append((cx, cy))
                         cv2.circle(highlighted, (int(cx), int(cy)), 5, (255, 0, 0), -1)
-            return highlighted, object_centers
+            # Convert all the (raw) pixel centroids to real-world coordinates at once if a transformation is provided.
+            transformer = getattr(self, "coordinate_transformer", None)
+            if pixel_centers and transformer is not None and transformer.H_inv is not None:
+                world_centers = transformer.raw_pixels_to_world(np.array(pixel_centers),
+                                                                (f1.shape[1], f1.shape[0]))
+                return highlighted, [tuple(pt) for pt in world_centers]
+            return highlighted, pixel_centers
 
         # Compute differences and centroids between frame pairs.
-        highlighted1, centers1 = compute_difference_and_centroids(frame1, frame2)
-        highlighted2, centers2 = compute_difference_and_centroids(frame2, frame3)
-        highlighted3, centers3 = compute_difference_and_centroids(frame1, frame3)
+        try:
+            highlighted1, centers1 = compute_difference_and_centroids(frame1, frame2)
+            highlighted2, centers2 = compute_difference_and_centroids(frame2, frame3)
+            highlighted3, centers3 = compute_difference_and_centroids(frame1, frame3)
+        except ValueError as e:
+            # Frames of another resolution than the homography image, with a calibration of unknown resolution
+            messagebox.showerror("Erreur", str(e))
+            return
 
         # Store the computed centroids in an instance variable.
         self.centers = {
@@ -6,12 +6,13 @@ import tkinter as tk
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from tkinter import filedialog, messagebox
-import cv2
-import numpy as np
 import qrcode
 from PIL import Image, ImageTk
 
-from calibration_db import load_calibrations
+import homography_cache
+import image_io
+from calibration_db import get_camera_model, list_cameras
+from map_export import EXPORT_FILETYPES, export_world_map
 from real_coordinates import CoordinateTransformer
 from capture_server import start_capture_server_in_thread, get_local_ip
 
@@ -59,7 +60,7 @@ class MapFrame(tb.Frame):
         action_frame.columnconfigure((0, 1), weight=1)
         tb.Button(action_frame, text="Generate Coordinate Map", command=self.generate_map, bootstyle="warning")\
             .grid(row=0, column=0, sticky="ew", padx=5, pady=5)
-        tb.Button(action_frame, text="Export Matrix to TXT", command=self.export_matrix, bootstyle="secondary")\
+        tb.Button(action_frame, text="Export Matrix", command=self.export_matrix, bootstyle="secondary")\
             .grid(row=0, column=1, sticky="ew", padx=5, pady=5)
         
         # ---- Section 4: Text Output Area ----
@@ -70,9 +71,7 @@ class MapFrame(tb.Frame):
         self.last_world_coords = None  # For exporting the coordinate matrix
 
     def update_camera_choices(self):
-        calibrations = load_calibrations()
-        cam_names = list(calibrations.keys())
-        self.camera_choice['values'] = cam_names
+        self.camera_choice['values'] = list_cameras()
 
     def select_test_image(self):
         self.test_image_path = filedialog.askopenfilename(
@@ -134,15 +133,11 @@ class MapFrame(tb.Frame):
 
     def generate_map(self):
         if self.use_existing_var.get() == "yes":
-            calibrations = load_calibrations()
             camera_name = self.camera_choice.get().strip()
-            if not camera_name or camera_name not in calibrations:
+            camera_model = get_camera_model(camera_name) if camera_name else None
+            if camera_model is None:
                 messagebox.showerror("Error", "Please select a valid camera from existing calibrations.")
                 return
-            cam_data = calibrations[camera_name]
-            camera_matrix = np.array(cam_data["camera_matrix"])
-            dist_coefs = np.array(cam_data["dist_coefs"])
-            pattern_size = tuple(cam_data["pattern_size"])
         
         else:
             messagebox.showinfo("Info", "Please calibrate a new camera in the Calibration tab first.")
@@ -152,13 +147,13 @@ class MapFrame(tb.Frame):
             messagebox.showerror("Error", "Please select a test image.")
             return
 
-        test_img = cv2.imread(self.test_image_path)
+        test_img = image_io.read_color(self.test_image_path)
         if test_img is None:
             messagebox.showerror("Error", "Could not load test image.")
             return
 
-        transformer = CoordinateTransformer(camera_matrix, dist_coefs, pattern_size)
-        if not transformer.compute_homography(test_img):
+        transformer = CoordinateTransformer.from_camera_model(camera_model)
+        if not transformer.compute_homography(test_img, homography_cache.default_cache(), self.test_image_path):
             messagebox.showerror("Error", "Failed to compute homography on test image.")
             return
 
@@ -183,16 +178,14 @@ class MapFrame(tb.Frame):
             messagebox.showerror("Error", "No coordinate map available to export. Generate it first.")
             return
         filepath = filedialog.asksaveasfilename(
-            defaultextension=".txt",
-            filetypes=[("Text files", "*.txt")],
+            defaultextension=".npy",
+            filetypes=EXPORT_FILETYPES,
             title="Save Coordinate Matrix"
         )
         if not filepath:
             return
         try:
-            array_str = np.array2string(self.last_world_coords, threshold=np.inf, separator=', ')
-            with open(filepath, 'w') as f:
-                f.write(array_str)
+            export_world_map(self.last_world_coords, filepath)
             messagebox.showinfo("Export Successful", f"Coordinate matrix exported to:\n{filepath}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export matrix: {e}")
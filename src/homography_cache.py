@@ -0,0 +1,55 @@
+import os
+import numpy as np
+from typing import Optional, Tuple
+
+from calibration_db import DATA_DIR
+from corner_cache import JsonCache
+
+HOMOGRAPHY_CACHE = os.path.join(DATA_DIR, "homography_cache.json")
+
+
+class HomographyCache(JsonCache):
+    """
+    On-disk cache of the homographies computed by CoordinateTransformer.compute_homography.
+
+    Entries are keyed by image content, camera calibration and pattern size
+    (see CoordinateTransformer.homography_key), and hold H, H_inv and the
+    refined corners. Images where the board was not found are cached as well.
+    """
+
+    def __init__(self, path: str = HOMOGRAPHY_CACHE, max_entries: int = 500):
+        super().__init__(path, max_entries)
+
+    def get(self, key: str) -> Optional[Tuple[Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray]]]:
+        """
+        Look up a homography.
+
+        Returns:
+            (H, H_inv, corners), all None if the board was not found,
+            or None on a cache miss
+        """
+        entry = self._get_entry(key)
+        if entry is None:
+            return None
+        if entry["H"] is None:
+            return None, None, None
+        return (np.array(entry["H"], dtype=np.float64), np.array(entry["H_inv"], dtype=np.float64),
+                np.array(entry["corners"], dtype=np.float32).reshape(-1, 1, 2))
+
+    def put(self, key: str, H: Optional[np.ndarray], H_inv: Optional[np.ndarray], corners: Optional[np.ndarray]):
+        self._put_entry(key, {
+            "H": H.tolist() if H is not None else None,
+            "H_inv": H_inv.tolist() if H_inv is not None else None,
+            "corners": corners.tolist() if corners is not None else None
+        })
+
+
+_default_cache = None
+
+
+def default_cache() -> HomographyCache:
+    """Cache instance shared by the GUI frames of this process."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HomographyCache()
+    return _default_cache
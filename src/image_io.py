@@ -0,0 +1,141 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# EXIF orientations for which OpenCV rotates the image by 90 degrees when decoding
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+_EXIF_ORIENTATION = 0x0112
+
+_REDUCED_FLAGS = {
+    "gray": {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+             4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8},
+    "color": {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+              4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8},
+}
+
+
+class _FrameCache:
+    """Small thread-safe LRU of decoded frames, invalidated when the file changes."""
+
+    def __init__(self, max_items: int = 4):
+        self.max_items = max_items
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, key, frame: np.ndarray):
+        with self._lock:
+            self._frames[key] = frame
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.max_items:
+                self._frames.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+
+
+_cache = _FrameCache()
+
+
+def read_size(path: str) -> Tuple[int, int]:
+    """
+    Read the size of an image from its header, without decoding the pixels.
+
+    Args:
+        path: Path of the image
+
+    Returns:
+        (width, height) as cv2.imread would return it (EXIF orientation applied)
+    """
+    with Image.open(path) as img:
+        w, h = img.size
+        if img.getexif().get(_EXIF_ORIENTATION) in _TRANSPOSED_ORIENTATIONS:
+            w, h = h, w
+    return w, h
+
+
+def read_gray(path: str, reduce: int = 1, cache: bool = True):
+    """
+    Decode an image straight to grayscale.
+
+    Args:
+        path: Path of the image
+        reduce: Downscaling factor applied while decoding (1, 2, 4 or 8)
+        cache: Keep the decoded frame in the shared LRU
+
+    Returns:
+        Grayscale image (read-only when cached), or None if it could not be loaded
+    """
+    return _read(path, "gray", reduce, cache)
+
+
+def read_color(path: str, reduce: int = 1, cache: bool = True):
+    """
+    Decode an image to BGR.
+
+    Args:
+        path: Path of the image
+        reduce: Downscaling factor applied while decoding (1, 2, 4 or 8)
+        cache: Keep the decoded frame in the shared LRU
+
+    Returns:
+        BGR image (read-only when cached), or None if it could not be loaded
+    """
+    return _read(path, "color", reduce, cache)
+
+
+def _read(path: str, mode: str, reduce: int, cache: bool):
+    if reduce not in _REDUCED_FLAGS[mode]:
+        raise ValueError(f"Unsupported reduction factor {reduce}, expected 1, 2, 4 or 8.")
+    if not cache:
+        return cv2.imread(path, _REDUCED_FLAGS[mode][reduce])
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, mode, reduce)
+    img = _cache.get(key)
+    if img is None:
+        img = cv2.imread(path, _REDUCED_FLAGS[mode][reduce])
+        if img is None:
+            return None
+        # Shared between callers: whoever needs to draw on it must copy it
+        img.setflags(write=False)
+        _cache.put(key, img)
+    return img
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-1 of a file's content.
+
+    Args:
+        path: Path of the file
+        chunk_size: Number of bytes read at a time
+
+    Returns:
+        Hexadecimal digest
+    """
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
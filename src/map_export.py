@@ -0,0 +1,62 @@
+"""
+Export of world coordinate maps (H x W x 2), written a block of rows at a time.
+
+The source is either an array (create_world_coordinates_map) or a lazy
+real_coordinates.WorldMap, so a map never has to be held in memory as a whole:
+
+- .npy: raw array, memory-mappable with np.load(path, mmap_mode="r")
+- .npz: deflate-compressed archive holding one "world_coords" array, np.load(path)["world_coords"]
+- .txt: one "world_x world_y" line per pixel in row-major order, np.loadtxt(path).reshape(H, W, 2)
+"""
+import os
+import zipfile
+from typing import Optional
+
+import numpy as np
+
+EXPORT_FORMATS = (".npy", ".npz", ".txt")
+# For tkinter file dialogs
+EXPORT_FILETYPES = [("NumPy array", "*.npy"), ("Compressed NumPy archive", "*.npz"), ("Text files", "*.txt")]
+ARCHIVE_KEY = "world_coords"
+EXPORT_CHUNK_PIXELS = 1 << 20
+
+
+def export_world_map(world_map, path: str, rows_per_chunk: Optional[int] = None):
+    """
+    Write a world coordinate map to path, the format being chosen by the extension.
+
+    Args:
+        world_map: (H, W, 2) array or WorldMap
+        path: Destination file (.npy, .npz or .txt)
+        rows_per_chunk: Rows read from the source per block (default: the WorldMap
+            tile size, or about EXPORT_CHUNK_PIXELS pixels)
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{extension}', expected one of {', '.join(EXPORT_FORMATS)}.")
+    height, width = world_map.shape[:2]
+    if rows_per_chunk is None:
+        rows_per_chunk = getattr(world_map, "tile_size", None) or max(1, EXPORT_CHUNK_PIXELS // max(width, 1))
+    chunks = (world_map[y0:min(height, y0 + rows_per_chunk)] for y0 in range(0, height, rows_per_chunk))
+
+    if extension == ".npy":
+        out = np.lib.format.open_memmap(path, mode="w+", dtype=world_map.dtype, shape=(height, width, 2))
+        y0 = 0
+        for chunk in chunks:
+            out[y0:y0 + len(chunk)] = chunk
+            y0 += len(chunk)
+        out.flush()
+        del out
+    elif extension == ".npz":
+        header = {"descr": np.lib.format.dtype_to_descr(np.dtype(world_map.dtype)),
+                  "fortran_order": False, "shape": (height, width, 2)}
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(ARCHIVE_KEY + ".npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array_header_1_0(f, header)
+                for chunk in chunks:
+                    f.write(np.ascontiguousarray(chunk).tobytes())
+    else:
+        with open(path, "w") as f:
+            f.write(f"# world_x world_y, {height} x {width} pixels in row-major order\n")
+            for chunk in chunks:
+                np.savetxt(f, np.asarray(chunk).reshape(-1, 2), fmt="%.6g")
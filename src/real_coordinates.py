@@ -1,3 +1,8 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
 import numpy as np
 import cv2
 import numpy as np
@@ -5,14 +10,169 @@ import matplotlib.pyplot as plt
 from glob import glob
 from typing import Tuple, List, Optional
 
+from board_detection import (DEFAULT_DETECTOR, BoardPrefilter, DetectorChoice, Region, board_region,
+                             detector_name, find_chessboard, get_detector)
+from calibration_db import DATA_DIR, scale_camera_matrix
+from homography_cache import HomographyCache
+
+# Undistortion remap tables, persisted next to the calibration database
+REMAP_DIR = os.path.join(DATA_DIR, "remap_cache")
+MAX_REMAP_TABLES = 2  # A 12 MP table takes ~72 MB in memory
+# Pixels per block when evaluating the homography over a whole image
+MAP_CHUNK_PIXELS = 1 << 18
+# Points per OpenCV call in the batch pixel <-> world conversions
+POINT_CHUNK = 1 << 18
+# Board tracking between video frames (CoordinateTransformer.track_homography)
+TRACK_LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                       criteria=(cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_COUNT, 30, 0.01))
+TRACK_MAX_ERROR = 1.0  # pixels
+
+_remap_tables = OrderedDict()
+_remap_lock = threading.Lock()
+
+
+def _camera_digest(camera_matrix: np.ndarray, dist_coefs: np.ndarray) -> str:
+    sha1 = hashlib.sha1(np.ascontiguousarray(camera_matrix, dtype=np.float64).tobytes())
+    sha1.update(np.ascontiguousarray(dist_coefs, dtype=np.float64).tobytes())
+    return sha1.hexdigest()[:16]
+
+
+def get_undistort_maps(camera_matrix: np.ndarray, dist_coefs: np.ndarray, image_size: Tuple[int, int],
+                       camera_name: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the undistortion remap tables of a camera at one resolution.
+
+    Tables are computed once with initUndistortRectifyMap in fixed-point form
+    (CV_16SC2 + interpolation table, 6 bytes per pixel), kept in memory and
+    persisted in REMAP_DIR, keyed by the calibration parameters and the size.
+
+    Args:
+        camera_matrix: Camera matrix
+        dist_coefs: Distortion coefficients
+        image_size: (width, height) of the images to undistort
+        camera_name: Optional camera name, used to name (and clean up) the persisted files
+
+    Returns:
+        Tuple (map1, map2) for cv2.remap
+    """
+    w, h = image_size
+    digest = _camera_digest(camera_matrix, dist_coefs)
+    key = (digest, w, h)
+    with _remap_lock:
+        maps = _remap_tables.get(key)
+        if maps is not None:
+            _remap_tables.move_to_end(key)
+            return maps
+
+    prefix = f"{camera_name}_" if camera_name else ""
+    path = os.path.join(REMAP_DIR, f"{prefix}{w}x{h}_{digest}.npz")
+    maps = None
+    if os.path.exists(path):
+        try:
+            with np.load(path) as data:
+                maps = (data["map1"], data["map2"])
+        except (OSError, ValueError, KeyError):
+            print(f"Ignoring unreadable remap table {path}")
+    if maps is None:
+        maps = cv2.initUndistortRectifyMap(camera_matrix, dist_coefs, None, camera_matrix, (w, h), cv2.CV_16SC2)
+        # Without a camera name, the tables of other unnamed cameras share the prefix: keep them
+        _save_maps(path, maps, f"{prefix}{w}x{h}_" if camera_name else None)
+
+    with _remap_lock:
+        _remap_tables[key] = maps
+        while len(_remap_tables) > MAX_REMAP_TABLES:
+            _remap_tables.popitem(last=False)
+    return maps
+
+
+def _save_maps(path: str, maps: Tuple[np.ndarray, np.ndarray], stale_prefix: Optional[str]):
+    try:
+        os.makedirs(REMAP_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=REMAP_DIR)
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, map1=maps[0], map2=maps[1])
+        os.replace(tmp_path, path)
+        if stale_prefix is None:
+            return
+        # Tables of a previous calibration of the same camera and size are obsolete
+        for name in os.listdir(REMAP_DIR):
+            stale = os.path.join(REMAP_DIR, name)
+            if name.startswith(stale_prefix) and name.endswith(".npz") and stale != path:
+                os.remove(stale)
+    except OSError as e:
+        print(f"Could not persist remap table {path}: {e}")
+
+
+def evaluate_homography(H: np.ndarray, y0: int, x0: int, out: np.ndarray):
+    """
+    Apply a homography to every pixel of a rectangular region, writing into out.
+
+    The row and column terms are broadcast over blocks of rows, so no pixel grid
+    is built and the temporaries stay within a few MAP_CHUNK_PIXELS float64 buffers.
+
+    Args:
+        H: 3 x 3 homography (pixel -> world)
+        y0: Row of the top-left pixel of the region
+        x0: Column of the top-left pixel of the region
+        out: Preallocated (rows, cols, 2) floating point array receiving the result
+    """
+    H = np.asarray(H, dtype=np.float64)
+    height, width = out.shape[:2]
+    cols = np.arange(x0, x0 + width, dtype=np.float64)
+    # Column terms of the numerators and of the denominator, shared by every row
+    col_x, col_y, col_w = H[0, 0] * cols, H[1, 0] * cols, H[2, 0] * cols
+
+    rows_per_chunk = max(1, MAP_CHUNK_PIXELS // max(width, 1))
+    for r0 in range(0, height, rows_per_chunk):
+        r1 = min(height, r0 + rows_per_chunk)
+        rows = np.arange(y0 + r0, y0 + r1, dtype=np.float64)[:, None]
+        inv_w = np.add(col_w, H[2, 1] * rows + H[2, 2])
+        np.reciprocal(inv_w, out=inv_w)
+        buffer = np.add(col_x, H[0, 1] * rows + H[0, 2])
+        buffer *= inv_w
+        out[r0:r1, :, 0] = buffer
+        np.add(col_y, H[1, 1] * rows + H[1, 2], out=buffer)
+        buffer *= inv_w
+        out[r0:r1, :, 1] = buffer
+
+
 class CoordinateTransformer:
-    def __init__(self, camera_matrix: np.ndarray, dist_coefs: np.ndarray, pattern_size: Tuple[int, int]):
+    def __init__(self, camera_matrix: np.ndarray, dist_coefs: np.ndarray, pattern_size: Tuple[int, int],
+                 camera_name: Optional[str] = None, image_size: Optional[Tuple[int, int]] = None,
+                 prefilter_max_dim: Optional[int] = None, detector: DetectorChoice = None):
         self.camera_matrix = camera_matrix
         self.dist_coefs = dist_coefs
         self.pattern_size = pattern_size
+        self.camera_name = camera_name
+        # Board detector backend: a name of board_detection.DETECTORS, or one per resolution {"WxH": name}
+        self.detector = detector
+        # When set, images failing a fast board check on a copy of this size are rejected without a full search
+        self.prefilter = BoardPrefilter(pattern_size, prefilter_max_dim) if prefilter_max_dim else None
+        # Resolution of the calibration; images of another size get rescaled intrinsics
+        self.image_size = tuple(image_size) if image_size else None
+        self._scaled_matrices = {}
+        # (width, height) of the image the homography was computed on
+        self.homography_size = None
         self.H = None
         self.H_inv = None
         self.corners = None
+        # Where the board was last found (x, y, width, height), searched first by the next detection
+        self.board_region = None
+        self._board_region_shape = None
+        # Board tracking state: LK pyramid of the previous frame and its raw corners
+        self._track_gray = None
+        self._track_points = None
+        self.tracking_stats = {"tracked": 0, "detected": 0, "lost": 0}
+
+    @classmethod
+    def from_camera_model(cls, camera_model, **kwargs) -> "CoordinateTransformer":
+        """
+        Transformer for a calibration_db.CameraModel: intrinsics, calibration resolution
+        and detector choices of the camera. kwargs are passed to the constructor.
+        """
+        return cls(camera_model.camera_matrix, camera_model.dist_coefs, camera_model.pattern_size,
+                   camera_name=camera_model.name, image_size=camera_model.image_size,
+                   detector=camera_model.detectors or None, **kwargs)
 
     def undistort_image(self, img: np.ndarray) -> np.ndarray:
         """
@@ -24,43 +184,214 @@ class CoordinateTransformer:
         Returns:
             Undistorted image
         """
-        return cv2.undistort(img, self.camera_matrix, self.dist_coefs, None, self.camera_matrix)
+        h, w = img.shape[:2]
+        camera_matrix = self.camera_matrix_for((w, h))
+        map1, map2 = get_undistort_maps(camera_matrix, self.dist_coefs, (w, h), self.camera_name)
+        return cv2.remap(img, map1, map2, cv2.INTER_LINEAR)
 
-    def compute_homography(self, img: np.ndarray) -> bool:
+    def camera_matrix_for(self, image_size: Tuple[int, int]) -> np.ndarray:
+        """
+        Camera matrix for images of image_size (width, height).
+
+        The calibration matrix is rescaled when the image has another resolution
+        with the same aspect ratio (e.g. a 720p video frame of a camera calibrated
+        on 12 MP photos). Without a recorded calibration resolution (image_size)
+        the matrix is returned unchanged: the image is assumed to have that resolution.
+
+        Args:
+            image_size: (width, height) of the image
+
+        Returns:
+            Camera matrix
+        """
+        image_size = tuple(image_size)
+        if self.image_size is None or image_size == self.image_size:
+            return self.camera_matrix
+        camera_matrix = self._scaled_matrices.get(image_size)
+        if camera_matrix is None:
+            camera_matrix = scale_camera_matrix(self.camera_matrix, self.image_size, image_size)
+            self._scaled_matrices[image_size] = camera_matrix
+        return camera_matrix
+
+    def homography_key(self, full_undistort: bool = False) -> str:
+        """Settings part of the HomographyCache key: camera calibration, pattern size, method and detection."""
+        w, h = self.pattern_size
+        method = "image" if full_undistort else "points"
+        prefilter = self.prefilter.max_dim if self.prefilter is not None else None
+        key = (f"{self.camera_name or ''}|{_camera_digest(self.camera_matrix, self.dist_coefs)}"
+               f"|pattern={w}x{h}|undistort={method}|prefilter={prefilter}")
+        if self.detector not in (None, DEFAULT_DETECTOR):
+            choice = self.detector if isinstance(self.detector, str) else sorted(self.detector.items())
+            key += f"|detector={choice}"
+        return key
+
+    def compute_homography(self, img: np.ndarray, cache: Optional[HomographyCache] = None,
+                           image_path: Optional[str] = None, full_undistort: bool = False,
+                           prior: Optional[Region] = None) -> bool:
         """
         Compute the homography matrix from the image.
 
+        By default the corners are found and refined on the raw image, and only
+        those points are undistorted (cv2.undistortPoints), which saves a full
+        frame remap. With full_undistort the whole image is undistorted before
+        the search. Either way H maps world units to undistorted pixels.
+
         Args:
-            img: Input image
+            img: Input image (BGR or grayscale)
+            cache: Optional homography cache, used together with image_path
+            image_path: Path of the file img was read from, identifies it in the cache
+            full_undistort: Undistort the whole image instead of the corners
+            prior: Optional (x, y, width, height) region where the board is expected, searched
+                (padded) before the full image. Defaults to where this transformer last found it.
 
         Returns:
             Boolean indicating success
         """
-        undistorted = self.undistort_image(img)
-        gray = cv2.cvtColor(undistorted, cv2.COLOR_BGR2GRAY)
+        h, w = img.shape[:2]
+        self.homography_size = (w, h)
+        if cache is None or image_path is None:
+            return self._detect_homography(img, full_undistort, prior)
 
-        found, corners = cv2.findChessboardCorners(gray, self.pattern_size)
-        if not found:
+        key = cache.key(image_path, self.homography_key(full_undistort))
+        cached = cache.get(key)
+        if cached is None:
+            rejected = self.prefilter.stats["rejected"] if self.prefilter is not None else 0
+            found = self._detect_homography(img, full_undistort, prior)
+            if found:
+                cache.put(key, self.H, self.H_inv, self.corners)
+            elif self.prefilter is None or self.prefilter.stats["rejected"] == rejected:
+                # Not after a prefilter rejection: the fast check is cheap to redo and
+                # a random audit may still find the board
+                cache.put(key, None, None, None)
+            cache.save()
+            return found
+        self.H, self.H_inv, self.corners = cached
+        return self.H is not None
+
+    def _detect_homography(self, img: np.ndarray, full_undistort: bool, prior: Optional[Region] = None) -> bool:
+        if full_undistort:
+            img = self.undistort_image(img)
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+        corners = self._find_corners(gray, prior)
+        if corners is None:
             return False
+        if not full_undistort:
+            corners = self._undistort_corners(corners, gray.shape)
+        self._set_homography(corners)
+        return True
 
-        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-        self.corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+    def _find_corners(self, gray: np.ndarray, prior: Optional[Region] = None) -> Optional[np.ndarray]:
+        if prior is None and self.board_region is not None and self._board_region_shape == gray.shape[:2]:
+            prior = self.board_region
+        backend = get_detector(detector_name(self.detector, gray.shape), tuple(self.pattern_size))
+        search = lambda image: find_chessboard(image, self.pattern_size, prior, backend.find)
+        if self.prefilter is None or backend.partial_boards:
+            corners = search(gray)
+        else:
+            corners = self.prefilter.run(gray, search)
+        if corners is None:
+            return None
+        if not backend.subpixel:
+            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+            corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+        self.board_region, self._board_region_shape = board_region(corners, self.pattern_size), gray.shape[:2]
+        return corners
+
+    def _undistort_corners(self, corners: np.ndarray, image_shape: Tuple[int, int]) -> np.ndarray:
+        h, w = image_shape[:2]
+        camera_matrix = self.camera_matrix_for((w, h))
+        return cv2.undistortPoints(corners.reshape(-1, 1, 2), camera_matrix, self.dist_coefs, P=camera_matrix)
 
+    def _fit_homography(self, corners: np.ndarray) -> Tuple[np.ndarray, float]:
+        # Homography world grid -> undistorted corners, and its largest residual in pixels
         grid = np.indices(self.pattern_size).T.reshape(-1, 2)
         world_points = np.zeros((grid.shape[0], 3), np.float32)
         world_points[:, :2] = grid * 1
 
-        self.H, _ = cv2.findHomography(world_points[:, :2], self.corners.reshape(-1, 2))
+        H, _ = cv2.findHomography(world_points[:, :2], corners.reshape(-1, 2))
+        if H is None:
+            return None, np.inf
+        projected = cv2.perspectiveTransform(world_points[:, None, :2], H)
+        return H, float(np.linalg.norm(projected.reshape(-1, 2) - corners.reshape(-1, 2), axis=1).max())
+
+    def _set_homography(self, corners: np.ndarray, H: Optional[np.ndarray] = None):
+        self.corners = corners
+        self.H = H if H is not None else self._fit_homography(corners)[0]
         self.H_inv = np.linalg.inv(self.H)
-        
+
+    def track_homography(self, frame: np.ndarray, max_error: float = TRACK_MAX_ERROR) -> bool:
+        """
+        Update the homography for the next frame of a video.
+
+        The raw corners of the previous frame are followed with pyramidal
+        Lucas-Kanade, re-snapped with a small cornerSubPix and the homography is
+        refitted from them. A full detection is only run on the first frame, or
+        when tracking is lost: a point lost by the flow, a forward-backward
+        error or a homography residual above max_error pixels.
+
+        Args:
+            frame: Video frame (BGR or grayscale)
+            max_error: Largest accepted tracking error in pixels
+
+        Returns:
+            Boolean indicating success (False when the board was lost and not found again)
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        h, w = gray.shape[:2]
+        self.homography_size = (w, h)
+
+        if self._track_gray is not None and self._track_gray.shape == gray.shape:
+            corners = self._track_corners(gray, max_error)
+            if corners is not None:
+                undistorted = self._undistort_corners(corners, gray.shape)
+                H, residual = self._fit_homography(undistorted)
+                if residual <= max_error:
+                    self._set_homography(undistorted, H)
+                    self._track_gray, self._track_points = gray, corners
+                    self.board_region = board_region(corners, self.pattern_size)
+                    self._board_region_shape = gray.shape[:2]
+                    self.tracking_stats["tracked"] += 1
+                    return True
+            self.tracking_stats["lost"] += 1
+
+        corners = self._find_corners(gray)
+        if corners is None:
+            self.reset_tracking()
+            return False
+        self._set_homography(self._undistort_corners(corners, gray.shape))
+        self._track_gray, self._track_points = gray, corners.reshape(-1, 1, 2).astype(np.float32)
+        self.tracking_stats["detected"] += 1
         return True
 
+    def _track_corners(self, gray: np.ndarray, max_error: float) -> Optional[np.ndarray]:
+        previous = self._track_points
+        corners, status, _err = cv2.calcOpticalFlowPyrLK(self._track_gray, gray, previous, None, **TRACK_LK_PARAMS)
+        if corners is None or not status.all():
+            return None
+        # Forward-backward check: flowing the points back must land on the previous corners
+        back, status, _err = cv2.calcOpticalFlowPyrLK(gray, self._track_gray, corners, None, **TRACK_LK_PARAMS)
+        if back is None or not status.all():
+            return None
+        if np.linalg.norm((back - previous).reshape(-1, 2), axis=1).max() > max_error:
+            return None
+        # Snap back onto the corners, the flow alone drifts by a fraction of a pixel per frame
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+        return cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
+
+    def reset_tracking(self):
+        """Forget the tracked board, the next track_homography call runs a full detection."""
+        self._track_gray = None
+        self._track_points = None
+
     def pixel_to_world(self, pixel_points: np.ndarray) -> np.ndarray:
         """
-        Convert pixel coordinates to world coordinates.
+        Convert undistorted pixel coordinates to world coordinates.
+
+        Points of the raw (distorted) image go through raw_pixels_to_world instead.
 
         Args:
-            pixel_points: Array of pixel coordinates
+            pixel_points: Array of undistorted pixel coordinates
 
         Returns:
             Array of world coordinates
@@ -71,6 +402,72 @@ class CoordinateTransformer:
         world_points = cv2.perspectiveTransform(pixel_points_reshaped, self.H_inv)
         return world_points.reshape(-1, 2)
 
+    def raw_pixels_to_world(self, points: np.ndarray, image_size: Optional[Tuple[int, int]] = None
+                            ) -> np.ndarray:
+        """
+        Convert raw (distorted) pixel coordinates to world coordinates.
+
+        Undistortion and the homography are folded into one cv2.undistortPoints
+        and one cv2.perspectiveTransform per block of POINT_CHUNK points.
+
+        Args:
+            points: N x 2 array of raw pixel coordinates
+            image_size: (width, height) of the image the points come from, e.g. a video
+                frame of another resolution (default: the image of the homography).
+                Another resolution requires the calibration resolution (ValueError otherwise).
+
+        Returns:
+            N x 2 float64 array of world coordinates
+        """
+        camera_matrix, H_normalized = self._normalized_homography(image_size)
+        M = self.H_inv @ H_normalized
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+        world = np.empty((len(points), 2), np.float64)
+        for i in range(0, len(points), POINT_CHUNK):
+            normalized = cv2.undistortPoints(points[i:i + POINT_CHUNK], camera_matrix, self.dist_coefs)
+            world[i:i + POINT_CHUNK] = cv2.perspectiveTransform(normalized, M).reshape(-1, 2)
+        return world
+
+    def world_to_raw_pixels(self, world_points: np.ndarray, image_size: Optional[Tuple[int, int]] = None
+                            ) -> np.ndarray:
+        """
+        Convert world coordinates to raw (distorted) pixel coordinates, the inverse of raw_pixels_to_world.
+
+        Args:
+            world_points: N x 2 array of world coordinates
+            image_size: (width, height) of the image to project into (default: the image of the homography)
+
+        Returns:
+            N x 2 float64 array of raw pixel coordinates
+        """
+        camera_matrix, H_normalized = self._normalized_homography(image_size)
+        M = np.linalg.inv(H_normalized) @ self.H
+        world_points = np.asarray(world_points, dtype=np.float64).reshape(-1, 1, 2)
+        pixels = np.empty((len(world_points), 2), np.float64)
+        no_motion = np.zeros(3)
+        for i in range(0, len(world_points), POINT_CHUNK):
+            normalized = cv2.perspectiveTransform(world_points[i:i + POINT_CHUNK], M).reshape(-1, 2)
+            rays = np.column_stack((normalized, np.ones(len(normalized))))
+            projected, _ = cv2.projectPoints(rays, no_motion, no_motion, camera_matrix, self.dist_coefs)
+            pixels[i:i + POINT_CHUNK] = projected.reshape(-1, 2)
+        return pixels
+
+    def _normalized_homography(self, image_size: Optional[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        # Camera matrix of the points' image, and the camera matrix of the homography image
+        # (normalized coordinates -> undistorted pixels the homography was estimated in)
+        if self.H_inv is None:
+            raise ValueError("Homography matrix not computed. Call compute_homography first.")
+        homography_size = self.homography_size or image_size
+        if homography_size is None:
+            raise ValueError("Image size unknown. Pass image_size or call compute_homography first.")
+        if image_size is not None and tuple(image_size) != tuple(homography_size) and self.image_size is None:
+            # Rescaling needs the resolution the intrinsics belong to
+            raise ValueError(f"Points of a {image_size[0]}x{image_size[1]} image cannot be converted with a "
+                             f"homography computed on a {homography_size[0]}x{homography_size[1]} image: "
+                             "the calibration resolution of this camera is unknown, recalibrate it.")
+        camera_matrix = self.camera_matrix_for(image_size or homography_size)
+        return camera_matrix, np.asarray(self.camera_matrix_for(homography_size), dtype=np.float64)
+
     def get_coordinate_system_points(self, num_units: float = 2.0) -> Tuple[tuple, tuple, tuple]:
         """
         Get the points for drawing the coordinate system.
@@ -97,31 +494,32 @@ class CoordinateTransformer:
 
         return origin, tuple(x_axis_end), tuple(y_axis_end)
     
-    def create_world_coordinates_map(self, image_shape: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    def create_world_coordinates_map(self, image_shape: Tuple[int, int], dtype=np.float32
+                                     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
         Create matrices containing the world coordinates for every pixel in the image.
 
+        The homography is evaluated straight into the output array (see
+        evaluate_homography), no pixel grid is built. For large images of which
+        only regions are needed, see WorldMap.
+
         Args:
             image_shape: Tuple of (height, width) of the image
+            dtype: Floating point type of the result (np.float16, np.float32 or np.float64)
 
         Returns:
-            Tuple of two 2D arrays (world_x, world_y) where each element contains
-            the x and y world coordinates for the corresponding pixel
+            Tuple of (world_coords, world_x, world_y): the H x W x 2 map and
+            its x and y planes (views of world_coords)
         """
         if self.H_inv is None:
             raise ValueError("Homography matrix not computed. Call compute_homography first.")
+        dtype = np.dtype(dtype)
+        if dtype.kind != "f":
+            raise ValueError(f"Unsupported map dtype {dtype}, expected a floating point type.")
 
-        # Create meshgrid of pixel coordinates
         height, width = image_shape[:2]
-        y_coords, x_coords = np.mgrid[0:height, 0:width]
-
-        # Reshape pixel coordinates into (N, 1, 2) array for perspectiveTransform
-        pixel_coords = np.stack((x_coords, y_coords), axis=-1).astype(np.float32)
-        pixel_coords_reshaped = pixel_coords.reshape(-1, 1, 2)
-
-        # Transform all pixel coordinates to world coordinates
-        world_coords = cv2.perspectiveTransform(pixel_coords_reshaped, self.H_inv)
-        world_coords = world_coords.reshape(height, width, 2)
+        world_coords = np.empty((height, width, 2), dtype)
+        evaluate_homography(self.H_inv, 0, 0, world_coords)
 
         # Split into separate x and y coordinate matrices
         world_x = world_coords[..., 0]
@@ -164,4 +562,146 @@ class CoordinateTransformer:
         
         # Make axes equal to preserve shape
         plt.axis('equal')
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+class WorldMap:
+    """
+    Lazy world coordinate map of an image, computed tile by tile on demand.
+
+    Indexing works like the array returned by create_world_coordinates_map:
+    world_map[y0:y1, x0:x1] is a (rows, cols, 2) array of world coordinates.
+
+    In memory, tiles are kept in an LRU of max_tiles entries. With a path, the
+    map is backed by a memory-mapped .npy file instead: computed tiles are
+    written to it and the operating system decides what stays in RAM, so
+    full-resolution maps of large images can be used and saved as is.
+    """
+
+    def __init__(self, transformer: CoordinateTransformer, image_shape: Tuple[int, int], tile_size: int = 256,
+                 max_tiles: int = 64, dtype=np.float32, path: Optional[str] = None):
+        if transformer.H_inv is None:
+            raise ValueError("Homography matrix not computed. Call compute_homography first.")
+        self.dtype = np.dtype(dtype)
+        if self.dtype.kind != "f":
+            raise ValueError(f"Unsupported map dtype {self.dtype}, expected a floating point type.")
+        # Snapshot: a later compute_homography on the transformer does not mix two maps
+        self.H_inv = np.array(transformer.H_inv, dtype=np.float64)
+        self.height, self.width = image_shape[:2]
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.path = path
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._memmap = None
+        if path is not None:
+            self._memmap = np.lib.format.open_memmap(path, mode="w+", dtype=self.dtype, shape=self.shape)
+            self._computed = np.zeros((-(-self.height // tile_size), -(-self.width // tile_size)), bool)
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.height, self.width, 2
+
+    def tile(self, ty: int, tx: int) -> np.ndarray:
+        """
+        World coordinates of one tile (computed on first access).
+
+        Args:
+            ty: Tile row
+            tx: Tile column
+
+        Returns:
+            Array of shape (<= tile_size, <= tile_size, 2), read-only
+        """
+        y0, x0 = ty * self.tile_size, tx * self.tile_size
+        if not (0 <= y0 < self.height and 0 <= x0 < self.width):
+            raise IndexError(f"Tile ({ty}, {tx}) outside the map.")
+        y1, x1 = min(self.height, y0 + self.tile_size), min(self.width, x0 + self.tile_size)
+
+        if self._memmap is not None:
+            region = self._memmap[y0:y1, x0:x1]
+            with self._lock:
+                if not self._computed[ty, tx]:
+                    evaluate_homography(self.H_inv, y0, x0, region)
+                    self._computed[ty, tx] = True
+            return region
+
+        with self._lock:
+            tile = self._tiles.get((ty, tx))
+            if tile is not None:
+                self._tiles.move_to_end((ty, tx))
+                return tile
+        tile = np.empty((y1 - y0, x1 - x0, 2), self.dtype)
+        evaluate_homography(self.H_inv, y0, x0, tile)
+        tile.setflags(write=False)
+        with self._lock:
+            self._tiles[(ty, tx)] = tile
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def region(self, y0: int, y1: int, x0: int, x1: int) -> np.ndarray:
+        """
+        World coordinates of the pixels [y0, y1) x [x0, x1).
+
+        Returns:
+            Array of shape (y1 - y0, x1 - x0, 2); a view of the file for memory-mapped maps
+        """
+        y0, y1 = max(0, y0), min(self.height, y1)
+        x0, x1 = max(0, x0), min(self.width, x1)
+        if y1 <= y0 or x1 <= x0:
+            return np.empty((max(0, y1 - y0), max(0, x1 - x0), 2), self.dtype)
+
+        size = self.tile_size
+        tile_rows = range(y0 // size, (y1 - 1) // size + 1)
+        tile_cols = range(x0 // size, (x1 - 1) // size + 1)
+        if self._memmap is not None:
+            for ty in tile_rows:
+                for tx in tile_cols:
+                    self.tile(ty, tx)
+            return self._memmap[y0:y1, x0:x1]
+
+        out = np.empty((y1 - y0, x1 - x0, 2), self.dtype)
+        for ty in tile_rows:
+            for tx in tile_cols:
+                tile = self.tile(ty, tx)
+                ty0, tx0 = ty * size, tx * size
+                # Intersection of the tile with the region, in image coordinates
+                iy0, iy1 = max(y0, ty0), min(y1, ty0 + tile.shape[0])
+                ix0, ix1 = max(x0, tx0), min(x1, tx0 + tile.shape[1])
+                out[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0] = tile[iy0 - ty0:iy1 - ty0, ix0 - tx0:ix1 - tx0]
+        return out
+
+    def __getitem__(self, key) -> np.ndarray:
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > 3:
+            raise IndexError("WorldMap is indexed as [rows, cols, component].")
+        key = key + (slice(None),) * (3 - len(key))
+        bounds = []
+        local = []
+        for index, size in zip(key[:2], (self.height, self.width)):
+            if isinstance(index, slice):
+                start, stop, step = index.indices(size)
+                if step < 0:
+                    start, stop = stop + 1, start + 1
+                local.append(slice(None, None, step))
+                bounds.append((start, max(start, stop)))
+            else:
+                index = int(index)
+                if index < 0:
+                    index += size
+                if not 0 <= index < size:
+                    raise IndexError(f"Index {index} out of range for size {size}.")
+                bounds.append((index, index + 1))
+                local.append(0)
+        (y0, y1), (x0, x1) = bounds
+        return self.region(y0, y1, x0, x1)[local[0], local[1], key[2]]
+
+    def to_array(self) -> np.ndarray:
+        """Compute every tile and return the full (H, W, 2) map (the memmap itself when file-backed)."""
+        return self.region(0, self.height, 0, self.width)
+
+    def flush(self):
+        """Write the computed tiles of a file-backed map to disk."""
+        if self._memmap is not None:
+            self._memmap.flush()
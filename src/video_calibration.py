@@ -0,0 +1,115 @@
+import os
+import cv2
+import numpy as np
+from typing import Callable, List, Optional, Tuple
+
+from board_detection import DEFAULT_DETECTOR, BoardPrefilter, get_detector
+from camera_calibration import CameraCalibrator, view_features, diverse_subset
+
+
+class VideoFrameSelector:
+    """
+    Pick calibration views straight from a video.
+
+    The video is decoded once. Each frame is first checked for a board on a
+    small copy; only frames whose board position, scale or tilt differs
+    enough from the views already kept are refined at full resolution. The
+    most diverse views are then handed to the CameraCalibrator in memory,
+    no frame is written to disk.
+    """
+
+    def __init__(self, calibrator: CameraCalibrator, max_views: int = 40, frame_step: int = 3,
+                 check_max_dim: int = 640, min_distance: float = 0.05):
+        """
+        Args:
+            calibrator: Calibrator receiving the selected views
+            max_views: Maximum number of views passed to the calibration
+            frame_step: Only every frame_step-th frame is examined
+            check_max_dim: Size of the longest side of the copy used for the board check
+            min_distance: Minimum feature distance between a new candidate and the views kept so far
+        """
+        self.calibrator = calibrator
+        self.max_views = max_views
+        self.frame_step = max(1, frame_step)
+        self.check_max_dim = check_max_dim
+        self.min_distance = min_distance
+        self.prefilter = BoardPrefilter(calibrator.pattern_size, check_max_dim)
+
+    def select(self, video_path: str, progress: Optional[Callable[[int, int], None]] = None
+               ) -> Tuple[List[Tuple[str, np.ndarray]], Optional[Tuple[int, int]]]:
+        """
+        Decode the video and return its most diverse board views.
+
+        Args:
+            video_path: Path of the calibration video
+            progress: Optional callback receiving (frame_index, frame_count)
+
+        Returns:
+            Tuple of (views, image_size) where views is a list of (name, corners)
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video {video_path}")
+
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        pattern_size = self.calibrator.pattern_size
+        names, corners_list, features = [], [], []
+        image_size = None
+        index = -1
+        try:
+            while True:
+                index += 1
+                if index % self.frame_step:
+                    if not cap.grab():
+                        break
+                    continue
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if progress is not None:
+                    progress(index, frame_count)
+
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                h, w = gray.shape[:2]
+                image_size = (w, h)
+                checked = self.prefilter.check(gray)
+                if checked is None:
+                    continue
+                coarse, scale = checked
+
+                feature = view_features((coarse + 0.5) / scale - 0.5, image_size, pattern_size)
+                if features and np.linalg.norm(np.array(features) - feature, axis=1).min() < self.min_distance:
+                    continue
+
+                corners = self.calibrator._refine_coarse_corners(gray, coarse, scale)
+                if corners is None:
+                    # Coarse corners too far off for cornerSubPix: search this frame at full resolution
+                    corners = self.calibrator._find_corners_full(gray, get_detector(DEFAULT_DETECTOR,
+                                                                                    tuple(pattern_size)))
+                    if corners is None:
+                        continue
+                names.append(f"{video_path}#{index}")
+                corners_list.append(corners.reshape(-1, 2))
+                features.append(view_features(corners, image_size, pattern_size))
+        finally:
+            cap.release()
+
+        chosen = diverse_subset(np.array(features), self.max_views)
+        report = self.prefilter.report()
+        print(f"{os.path.basename(video_path)}: {report['rejected']}/{report['checked']} frames without a board, "
+              f"{len(features)} candidate views, {len(chosen)} kept")
+        return [(names[i], corners_list[i]) for i in chosen], image_size
+
+    def calibrate(self, video_path: str, progress: Optional[Callable[[int, int], None]] = None
+                  ) -> Tuple[float, np.ndarray, np.ndarray, int]:
+        """
+        Select views from the video and calibrate the camera with them.
+
+        Returns:
+            Tuple of (rms, camera_matrix, dist_coefs, number of views used)
+        """
+        views, image_size = self.select(video_path, progress)
+        if not views:
+            raise ValueError("Chessboard not found in any frame of the video.")
+        rms, camera_matrix, dist_coefs = self.calibrator.add_corner_views(views, image_size)
+        return rms, camera_matrix, dist_coefs, len(views)